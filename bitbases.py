@@ -0,0 +1,259 @@
+"""
+Endgame bitbases for king and pawn, king and rook, and king and queen against a lone king.
+
+Each table holds one bit per position: set when the side with the extra piece (the strong
+side) wins with best play, clear when the position is drawn. Tables are built offline by
+retrograde analysis over positions generated with the GameState rules and stored packed,
+eight positions per byte, under tables/. The fifty-move rule is not taken into account.
+
+Positions are indexed with the strong side as white moving up the board, folded by symmetry:
+KPK mirrors the pawn onto files a-d, and the pawnless tables move the strong king into the
+10-square triangle a8-d8-d5 using the board's flips and its diagonal. probe() then costs one
+board scan and one bit lookup.
+
+    python bitbases.py              # (re)generate tables/kqk.bin, tables/krk.bin, tables/kpk.bin
+    result = bitbases.probe(gs)     # 1 side to move wins, -1 it loses, 0 draw, None not covered
+"""
+import argparse
+import os
+import sys
+import time
+from array import array
+
+import chess_engine
+
+TABLE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tables")
+# The tables KPK depends on come first, since promotions lead into them
+TABLE_NAMES = ("KQK", "KRK", "KPK")
+STRONG_TO_MOVE, WEAK_TO_MOVE = 0, 1
+
+# Strong king squares (row, col) for the pawnless tables: row <= col <= 3
+TRIANGLE = [(row, col) for row in range(4) for col in range(row, 4)]
+TRIANGLE_INDEX = {row * 8 + col: i for i, (row, col) in enumerate(TRIANGLE)}
+TABLE_SIZES = {"KQK": len(TRIANGLE) * 64 * 64 * 2, "KRK": len(TRIANGLE) * 64 * 64 * 2, "KPK": 24 * 64 * 64 * 2}
+
+_tables = {} # Table name -> packed bits (bytes), or None when the file is missing
+
+
+def table_index(name, strong_king, weak_king, piece, side_to_move):
+    """
+    Index of a position in a table. Squares are row * 8 + col with the strong side playing up
+    the board (as white does); side_to_move is STRONG_TO_MOVE or WEAK_TO_MOVE.
+    """
+    if name == "KPK":
+        if piece & 7 > 3: # Mirror the pawn onto files a-d
+            strong_king ^= 7
+            weak_king ^= 7
+            piece ^= 7
+        pawn = ((piece >> 3) - 1) * 4 + (piece & 7)
+        return ((pawn * 64 + strong_king) * 64 + weak_king) * 2 + side_to_move
+    if strong_king & 7 > 3: # Flip left-right
+        strong_king ^= 7
+        weak_king ^= 7
+        piece ^= 7
+    if strong_king >> 3 > 3: # Flip top-bottom
+        strong_king ^= 56
+        weak_king ^= 56
+        piece ^= 56
+    if strong_king >> 3 > strong_king & 7: # Reflect in the a8-h1 diagonal
+        strong_king = _transpose(strong_king)
+        weak_king = _transpose(weak_king)
+        piece = _transpose(piece)
+    return ((TRIANGLE_INDEX[strong_king] * 64 + weak_king) * 64 + piece) * 2 + side_to_move
+
+
+def _transpose(sq):
+    return (sq & 7) * 8 + (sq >> 3)
+
+
+def _decode(name, index):
+    # Inverse of table_index for the canonical positions: (strong king, weak king, piece, side to move)
+    side_to_move = index & 1
+    index >>= 1
+    if name == "KPK":
+        weak_king, strong_king, pawn = index & 63, (index >> 6) & 63, index >> 12
+        return strong_king, weak_king, (pawn // 4 + 1) * 8 + pawn % 4, side_to_move
+    piece, weak_king, king = index & 63, (index >> 6) & 63, index >> 12
+    row, col = TRIANGLE[king]
+    return row * 8 + col, weak_king, piece, side_to_move
+
+
+def _kings_touch(a, b):
+    return max(abs((a >> 3) - (b >> 3)), abs((a & 7) - (b & 7))) <= 1
+
+
+def generate(name, tables):
+    """
+    Builds one table by retrograde analysis and returns it packed. tables holds the packed
+    tables already built, for the positions promotions lead to.
+    """
+    size = TABLE_SIZES[name]
+    piece_code = 'w' + name[1]
+    gs = chess_engine.GameState()
+    no_castling = chess_engine.CastleRights(False, False, False, False)
+    never = 1 << 30 # Remaining-moves count for positions the weak side can always escape from
+
+    # Pass 1: every position's successors inside the table, in flat arrays
+    win = bytearray(size)
+    legal = bytearray(size)
+    remaining = array('l', [0]) * size # Weak side to move: successors not yet known to be lost
+    successor_start = array('L', [0]) * (size + 1)
+    successors = array('L')
+    queue = []
+    for index in range(size):
+        successor_start[index] = len(successors)
+        strong_king, weak_king, piece, side_to_move = _decode(name, index)
+        if strong_king == weak_king or piece in (strong_king, weak_king) or _kings_touch(strong_king, weak_king):
+            continue
+        if name != "KPK" and index != table_index(name, strong_king, weak_king, piece, side_to_move):
+            continue # Symmetric duplicate of another index; never reached from a real position
+        board = [["--"] * 8 for _ in range(8)]
+        board[strong_king >> 3][strong_king & 7] = 'wK'
+        board[weak_king >> 3][weak_king & 7] = 'bK'
+        board[piece >> 3][piece & 7] = piece_code
+        if side_to_move == STRONG_TO_MOVE:
+            gs.load_position(board, False, no_castling)
+            if gs.in_check(): # The weak king can't be in check with the strong side to move
+                continue
+        gs.load_position(board, side_to_move == STRONG_TO_MOVE, no_castling)
+        legal[index] = 1
+        codes = gs.get_valid_move_codes()
+        if side_to_move == WEAK_TO_MOVE:
+            if gs.checkmate:
+                win[index] = 1
+                queue.append(index)
+                continue
+            remaining[index] = len(codes) if codes else never # Stalemate is a draw
+            for code in codes:
+                end = (code >> 6) & 63
+                if end == piece: # The lone king takes the piece: a draw
+                    remaining[index] = never
+                else:
+                    successors.append(table_index(name, strong_king, end, piece, STRONG_TO_MOVE))
+            continue
+        for code in codes:
+            start, end = code & 63, (code >> 6) & 63
+            if start == strong_king:
+                successors.append(table_index(name, end, weak_king, piece, WEAK_TO_MOVE))
+            elif not code & chess_engine.PROMOTION_FLAG:
+                successors.append(table_index(name, strong_king, weak_king, end, WEAK_TO_MOVE))
+            else:
+                promoted = "K" + chess_engine.Move.promotion_pieces[(code >> 12) & 3] + "K"
+                if promoted in tables and not win[index] and \
+                        probe_table(tables[promoted], promoted, strong_king, weak_king, end, WEAK_TO_MOVE):
+                    win[index] = 1
+                    queue.append(index)
+    successor_start[size] = len(successors)
+
+    # Pass 2: reverse the edges
+    predecessor_start = array('L', [0]) * (size + 1)
+    for target in successors:
+        predecessor_start[target + 1] += 1
+    for index in range(size):
+        predecessor_start[index + 1] += predecessor_start[index]
+    fill = array('L', predecessor_start)
+    predecessors = array('L', [0]) * len(successors)
+    for index in range(size):
+        for i in range(successor_start[index], successor_start[index + 1]):
+            target = successors[i]
+            predecessors[fill[target]] = index
+            fill[target] += 1
+
+    # Pass 3: spread wins backwards. The strong side wins if any move wins; the weak side
+    # loses once every one of its moves has been shown to lose
+    while queue:
+        index = queue.pop()
+        for i in range(predecessor_start[index], predecessor_start[index + 1]):
+            previous = predecessors[i]
+            if win[previous] or not legal[previous]:
+                continue
+            if previous & 1 == STRONG_TO_MOVE:
+                win[previous] = 1
+                queue.append(previous)
+            else:
+                remaining[previous] -= 1
+                if remaining[previous] == 0:
+                    win[previous] = 1
+                    queue.append(previous)
+
+    packed = bytearray((size + 7) // 8)
+    for index in range(size):
+        if win[index]:
+            packed[index >> 3] |= 1 << (index & 7)
+    return bytes(packed)
+
+
+def probe_table(table, name, strong_king, weak_king, piece, side_to_move):
+    index = table_index(name, strong_king, weak_king, piece, side_to_move)
+    return (table[index >> 3] >> (index & 7)) & 1
+
+
+def load(name):
+    """
+    The packed table for name, read once and kept; None when it has not been generated.
+    """
+    if name not in _tables:
+        path = os.path.join(TABLE_DIRECTORY, name.lower() + ".bin")
+        table = None
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                table = f.read()
+            if len(table) != (TABLE_SIZES[name] + 7) // 8:
+                table = None
+        _tables[name] = table
+    return _tables[name]
+
+
+def probe(gs):
+    """
+    Exact result of a KPK, KRK or KQK position from the side to move's point of view: 1 win,
+    -1 loss, 0 draw. None for any other material or when the table is missing.
+    """
+    kings = {}
+    extra = None
+    for r, row in enumerate(gs.board):
+        for c, piece in enumerate(row):
+            if piece == "--":
+                continue
+            if piece[1] == 'K':
+                kings[piece[0]] = r * 8 + c
+            elif extra is not None or piece[1] not in "PRQ":
+                return None
+            else:
+                extra = (piece, r * 8 + c)
+    if extra is None or len(kings) != 2:
+        return None
+    (color, kind), sq = extra
+    name = "K" + kind + "K"
+    table = load(name)
+    if table is None:
+        return None
+    strong_king, weak_king = kings[color], kings['b' if color == 'w' else 'w']
+    if color == 'b': # Turn the board over so the strong side plays up it
+        strong_king, weak_king, sq = strong_king ^ 56, weak_king ^ 56, sq ^ 56
+    strong_to_move = gs.white_to_move == (color == 'w')
+    if not probe_table(table, name, strong_king, weak_king, sq, STRONG_TO_MOVE if strong_to_move else WEAK_TO_MOVE):
+        return 0
+    return 1 if strong_to_move else -1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the endgame bitbases.")
+    parser.add_argument("--directory", default=TABLE_DIRECTORY)
+    args = parser.parse_args(argv)
+    os.makedirs(args.directory, exist_ok=True)
+    tables = {}
+    for name in TABLE_NAMES:
+        start = time.perf_counter()
+        tables[name] = generate(name, tables)
+        with open(os.path.join(args.directory, name.lower() + ".bin"), "wb") as f:
+            f.write(tables[name])
+        wins = sum(bin(byte).count("1") for byte in tables[name])
+        print(f"{name}: {TABLE_SIZES[name]} positions  {wins} wins  {len(tables[name])} bytes  "
+              f"{time.perf_counter() - start:.1f}s")
+    _tables.clear()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
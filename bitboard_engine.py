@@ -0,0 +1,496 @@
+"""
+Bitboard backend for the chess rules engine.
+
+BitboardGameState keeps twelve 64-bit piece sets plus occupancy masks instead of a grid of
+strings, and exposes the same make_move / undo_move / get_valid_moves API as
+chess_engine.GameState. Squares are numbered row * 8 + col with row 0 being rank 8, so they
+line up with GameState.board and Move coordinates.
+"""
+from array import array
+
+import evaluation
+from chess_engine import (CASTLE_FLAG, EN_PASSANT_FLAG, PIECE_CODE_INDEX, PIECE_CODES, PROMOTION_FLAG, CastleRights,
+                          GameState, Move, UndoStack, ZOBRIST_BLACK_TO_MOVE, ZOBRIST_CASTLING, ZOBRIST_EN_PASSANT,
+                          ZOBRIST_PIECES)
+
+PIECES = ('wP', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bP', 'bN', 'bB', 'bR', 'bQ', 'bK')
+PIECE_INDEX = {piece: i for i, piece in enumerate(PIECES)}
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6) # Offsets within a colour's six piece sets
+PROMOTION_OFFSETS = {'Q': QUEEN, 'R': ROOK, 'B': BISHOP, 'N': KNIGHT}
+FULL = (1 << 64) - 1
+
+
+def _leaper_attacks(offsets):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        attacks = 0
+        for d_row, d_col in offsets:
+            end_row, end_col = r + d_row, c + d_col
+            if 0 <= end_row < 8 and 0 <= end_col < 8:
+                attacks |= 1 << (end_row * 8 + end_col)
+        table.append(attacks)
+    return table
+
+
+KNIGHT_ATTACKS = _leaper_attacks(GameState.knight_offsets)
+KING_ATTACKS = _leaper_attacks(GameState.king_directions)
+# Squares attacked by a pawn of each colour standing on a square (white pawns move up the board)
+PAWN_ATTACKS = (_leaper_attacks(((-1, -1), (-1, 1))), _leaper_attacks(((1, -1), (1, 1))))
+
+# One ray table per direction (orthogonals first, then diagonals, as in GameState).
+# Directions that increase the square index find their nearest blocker with the lowest set
+# bit, the others with the highest
+DIRECTIONS = GameState.king_directions
+INCREASING = tuple(d_row * 8 + d_col > 0 for d_row, d_col in DIRECTIONS)
+
+
+def _build_rays():
+    rays = []
+    for d_row, d_col in DIRECTIONS:
+        table = []
+        for sq in range(64):
+            r, c = divmod(sq, 8)
+            ray = 0
+            for i in range(1, 8):
+                end_row, end_col = r + d_row * i, c + d_col * i
+                if not (0 <= end_row < 8 and 0 <= end_col < 8):
+                    break
+                ray |= 1 << (end_row * 8 + end_col)
+            table.append(ray)
+        rays.append(table)
+    return rays
+
+
+def _build_between():
+    # between[a * 64 + b] holds the squares strictly between two aligned squares (0 otherwise)
+    between = [0] * 4096
+    for sq in range(64):
+        for d in range(8):
+            ray = RAYS[d][sq]
+            while ray:
+                low = ray & -ray
+                target = low.bit_length() - 1
+                between[sq * 64 + target] = RAYS[d][sq] & ~RAYS[d][target] & ~low
+                ray ^= low
+    return between
+
+
+RAYS = _build_rays()
+ROOK_DIRECTIONS = (0, 1, 2, 3)
+BISHOP_DIRECTIONS = (4, 5, 6, 7)
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+ROOK_RAYS = [RAYS[0][sq] | RAYS[1][sq] | RAYS[2][sq] | RAYS[3][sq] for sq in range(64)]
+BISHOP_RAYS = [RAYS[4][sq] | RAYS[5][sq] | RAYS[6][sq] | RAYS[7][sq] for sq in range(64)]
+BETWEEN = _build_between()
+
+
+def slider_attacks(sq, occupied, directions):
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if INCREASING[d]:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= RAYS[d][blocker]
+        attacks |= ray
+    return attacks
+
+
+class BitboardGameState:
+    # These only touch the move, the board view and the bookkeeping attributes, so share them
+    update_castle_rights = GameState.update_castle_rights
+    compute_zobrist_key = GameState.compute_zobrist_key
+    is_threefold_repetition = GameState.is_threefold_repetition
+    is_fifty_move_draw = GameState.is_fifty_move_draw
+    get_snapshot = GameState.get_snapshot
+    load_snapshot = GameState.load_snapshot
+    from_fen = classmethod(GameState.from_fen.__func__)
+    load_fen = GameState.load_fen
+    to_fen = GameState.to_fen
+    evaluate = GameState.evaluate
+
+    def __init__(self):
+        self.undo_stack = UndoStack() # Irreversible state of every earlier position, alongside move_log
+        self.bitboards = [0] * 12
+        self.occupancy = [0, 0] # White pieces, black pieces
+        self.move_log = []
+        self.current_castling_rights = CastleRights(True, True, True, True)
+        self.repetition_counts = {}
+        self.load_position(GameState().board, True, self.current_castling_rights)
+
+    def load_position(self, board, white_to_move, castling_rights, en_passant_possible=(), halfmove_clock=0,
+                      fullmove_number=1):
+        # Replaces the whole position (board is a grid like GameState.board) and clears the game
+        # history, reusing the existing containers as GameState.load_position does
+        self.bitboards[:] = [0] * 12
+        self.occupancy[:] = [0, 0]
+        for r, row in enumerate(board):
+            for c, piece in enumerate(row):
+                if piece != "--":
+                    self.bitboards[PIECE_INDEX[piece]] |= 1 << (r * 8 + c)
+                    self.occupancy[piece[0] == 'b'] |= 1 << (r * 8 + c)
+        self.white_to_move = white_to_move
+        self.move_log.clear()
+        self.checkmate = False
+        self.stalemate = False
+        self.en_passant_possible = en_passant_possible # Coordinates for the square where en passant capture is possible
+        self.current_castling_rights.set_index(castling_rights.index())
+        self._board = None # Grid view, built only when something asks for it
+        self.draw = False # Threefold repetition or fifty-move rule, set by get_valid_moves
+        self.halfmove_clock = halfmove_clock # Plies since the last capture or pawn move
+        self.start_ply = 2 * (fullmove_number - 1) + (0 if white_to_move else 1) # Plies before move_log
+        self.undo_stack.clear()
+        self.zobrist_key = self.compute_zobrist_key()
+        self.repetition_counts.clear()
+        self.repetition_counts[self.zobrist_key] = 1
+        self.mg_score, self.eg_score, self.phase = evaluation.position_terms(board) # Running evaluation terms
+
+    @property
+    def board(self):
+        # The string grid is only needed for drawing, so derive it lazily and cache it until
+        # the position changes
+        if self._board is None:
+            board = [["--"] * 8 for _ in range(8)]
+            for i, bb in enumerate(self.bitboards):
+                while bb:
+                    low = bb & -bb
+                    sq = low.bit_length() - 1
+                    board[sq >> 3][sq & 7] = PIECES[i]
+                    bb ^= low
+            self._board = board
+        return self._board
+
+    @property
+    def white_king_location(self):
+        return divmod(self.bitboards[KING].bit_length() - 1, 8)
+
+    @property
+    def black_king_location(self):
+        return divmod(self.bitboards[6 + KING].bit_length() - 1, 8)
+
+    def make_move(self, move):
+        if not isinstance(move, Move): # Packed move code; move_log and undo_move need the Move
+            move = self.move_from_code(move)
+        bitboards = self.bitboards
+        occupancy = self.occupancy
+        us = 0 if self.white_to_move else 1
+        start = move.start_row * 8 + move.start_col
+        end = move.end_row * 8 + move.end_col
+        moved = PIECE_INDEX[move.piece_moved]
+        from_to = (1 << start) | (1 << end)
+        bitboards[moved] ^= from_to
+        occupancy[us] ^= from_to
+        rights = self.current_castling_rights.index()
+        self.undo_stack.push(self.zobrist_key, rights | (self.en_passant_possible[1] + 1 if self.en_passant_possible else 0) << 4 |
+                             PIECE_CODE_INDEX[move.piece_captured] << 8 | self.halfmove_clock << 12)
+        key = self.zobrist_key ^ ZOBRIST_BLACK_TO_MOVE ^ ZOBRIST_CASTLING[rights]
+        if self.en_passant_possible:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant_possible[1]]
+        key ^= ZOBRIST_PIECES[move.piece_moved][start]
+        mg, eg, phase = evaluation.move_delta(move)
+        self.mg_score += mg
+        self.eg_score += eg
+        self.phase += phase
+
+        if move.piece_captured != "--":
+            captured_sq = move.start_row * 8 + move.end_col if move.is_en_passant_move else end
+            bitboards[PIECE_INDEX[move.piece_captured]] ^= 1 << captured_sq
+            occupancy[1 - us] ^= 1 << captured_sq
+            key ^= ZOBRIST_PIECES[move.piece_captured][captured_sq]
+
+        # Pawn promotion
+        if move.is_pawn_promotion:
+            promoted = moved - PAWN + PROMOTION_OFFSETS[move.promotion_choice]
+            bitboards[moved] ^= 1 << end
+            bitboards[promoted] |= 1 << end
+            key ^= ZOBRIST_PIECES[PIECES[promoted]][end]
+        else:
+            key ^= ZOBRIST_PIECES[move.piece_moved][end]
+
+        if move.is_castle_move:
+            if move.end_col - move.start_col == 2: # Kingside castle
+                rook_from, rook_to = end + 1, end - 1
+            else: # Queenside castle
+                rook_from, rook_to = end - 2, end + 1
+            rook_move = (1 << rook_from) | (1 << rook_to)
+            bitboards[moved - KING + ROOK] ^= rook_move
+            occupancy[us] ^= rook_move
+            rook_keys = ZOBRIST_PIECES[PIECES[moved - KING + ROOK]]
+            key ^= rook_keys[rook_from] ^ rook_keys[rook_to]
+
+        if move.piece_moved[1] == 'P' and abs(move.start_row - move.end_row) == 2:
+            self.en_passant_possible = ((move.start_row + move.end_row) // 2, move.end_col)
+            key ^= ZOBRIST_EN_PASSANT[move.end_col]
+        else:
+            self.en_passant_possible = ()
+
+        self.update_castle_rights(move)
+        key ^= ZOBRIST_CASTLING[self.current_castling_rights.index()]
+
+        if move.piece_moved[1] == 'P' or move.piece_captured != "--":
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        self.zobrist_key = key
+        self.repetition_counts[key] = self.repetition_counts.get(key, 0) + 1
+        self.move_log.append(move)
+        self.white_to_move = not self.white_to_move
+        self._board = None
+
+    def undo_move(self):
+        if not self.move_log:
+            return
+        move = self.move_log.pop()
+        key, state = self.undo_stack.pop()
+        self.white_to_move = not self.white_to_move
+        bitboards = self.bitboards
+        occupancy = self.occupancy
+        us = 0 if self.white_to_move else 1
+        start = move.start_row * 8 + move.start_col
+        end = move.end_row * 8 + move.end_col
+        moved = PIECE_INDEX[move.piece_moved]
+
+        if move.is_pawn_promotion:
+            bitboards[moved - PAWN + PROMOTION_OFFSETS[move.promotion_choice]] ^= 1 << end
+            bitboards[moved] |= 1 << end
+        from_to = (1 << start) | (1 << end)
+        bitboards[moved] ^= from_to
+        occupancy[us] ^= from_to
+
+        captured = (state >> 8) & 15
+        if captured:
+            captured_sq = move.start_row * 8 + move.end_col if move.is_en_passant_move else end
+            bitboards[PIECE_INDEX[PIECE_CODES[captured]]] |= 1 << captured_sq
+            occupancy[1 - us] |= 1 << captured_sq
+
+        if move.is_castle_move:
+            if move.end_col - move.start_col == 2: # Kingside
+                rook_move = (1 << (end + 1)) | (1 << (end - 1))
+            else: # Queenside
+                rook_move = (1 << (end - 2)) | (1 << (end + 1))
+            bitboards[moved - KING + ROOK] ^= rook_move
+            occupancy[us] ^= rook_move
+
+        self.current_castling_rights.set_index(state & 15)
+        en_passant_file = (state >> 4) & 15
+        self.en_passant_possible = ((2 if self.white_to_move else 5), en_passant_file - 1) if en_passant_file else ()
+        self.halfmove_clock = state >> 12
+        if self.repetition_counts[self.zobrist_key] == 1:
+            del self.repetition_counts[self.zobrist_key]
+        else:
+            self.repetition_counts[self.zobrist_key] -= 1
+        self.zobrist_key = key
+        mg, eg, phase = evaluation.move_delta(move)
+        self.mg_score -= mg
+        self.eg_score -= eg
+        self.phase -= phase
+        self.checkmate = False
+        self.stalemate = False
+        self.draw = False
+        self._board = None
+
+    def attackers_to(self, sq, occupied, color):
+        # Pieces of `color` (0 white, 1 black) attacking sq, given an occupancy
+        bitboards = self.bitboards
+        offset = 6 * color
+        attackers = (PAWN_ATTACKS[1 - color][sq] & bitboards[offset + PAWN]) | \
+                    (KNIGHT_ATTACKS[sq] & bitboards[offset + KNIGHT]) | \
+                    (KING_ATTACKS[sq] & bitboards[offset + KING])
+        rooks = bitboards[offset + ROOK] | bitboards[offset + QUEEN]
+        if ROOK_RAYS[sq] & rooks:
+            attackers |= slider_attacks(sq, occupied, ROOK_DIRECTIONS) & rooks
+        bishops = bitboards[offset + BISHOP] | bitboards[offset + QUEEN]
+        if BISHOP_RAYS[sq] & bishops:
+            attackers |= slider_attacks(sq, occupied, BISHOP_DIRECTIONS) & bishops
+        return attackers
+
+    def is_attacked(self, sq, occupied, color):
+        # Whether any piece of `color` attacks sq. Unlike attackers_to this stops at the first
+        # attacker found, and only walks the slider rays that have a slider on them
+        bitboards = self.bitboards
+        offset = 6 * color
+        if PAWN_ATTACKS[1 - color][sq] & bitboards[offset + PAWN] or KNIGHT_ATTACKS[sq] & bitboards[offset + KNIGHT] or \
+                KING_ATTACKS[sq] & bitboards[offset + KING]:
+            return True
+        queens = bitboards[offset + QUEEN]
+        for directions, sliders in ((ROOK_DIRECTIONS, bitboards[offset + ROOK] | queens),
+                                    (BISHOP_DIRECTIONS, bitboards[offset + BISHOP] | queens)):
+            if not sliders:
+                continue
+            for d in directions:
+                ray = RAYS[d][sq]
+                if not ray & sliders:
+                    continue
+                blockers = ray & occupied
+                nearest = blockers & -blockers if INCREASING[d] else 1 << (blockers.bit_length() - 1)
+                if nearest & sliders:
+                    return True
+        return False
+
+    def square_under_attack(self, r, c):
+        # Check from perspective of current player, if the given square is attacked by opponent
+        them = 1 if self.white_to_move else 0
+        return self.is_attacked(r * 8 + c, self.occupancy[0] | self.occupancy[1], them)
+
+    def in_check(self):
+        us = 0 if self.white_to_move else 1
+        king_sq = self.bitboards[6 * us + KING].bit_length() - 1
+        return self.is_attacked(king_sq, self.occupancy[0] | self.occupancy[1], 1 - us)
+
+    def piece_on(self, sq):
+        # Piece code ("wP", "--", ...) on a square numbered row * 8 + col
+        bit = 1 << sq
+        for i in range(12):
+            if self.bitboards[i] & bit:
+                return PIECES[i]
+        return "--"
+
+    def move_from_code(self, code):
+        return Move.from_pieces(code, self.piece_on(code & 63), self.piece_on((code >> 6) & 63))
+
+    def get_valid_moves(self):
+        return [self.move_from_code(code) for code in self.get_valid_move_codes()]
+
+    def get_valid_move_codes(self):
+        # Legal moves as packed move codes (see chess_engine) in an array('I')
+        moves = array('I')
+        bitboards = self.bitboards
+        us = 0 if self.white_to_move else 1
+        them = 1 - us
+        offset = 6 * us
+        enemy_offset = 6 * them
+        own = self.occupancy[us]
+        occupied = own | self.occupancy[them]
+        king_sq = bitboards[offset + KING].bit_length() - 1
+        checkers = self.attackers_to(king_sq, occupied, them)
+
+        # King moves: test each target with the king lifted off the board
+        without_king = occupied ^ (1 << king_sq)
+        targets = KING_ATTACKS[king_sq] & ~own
+        while targets:
+            low = targets & -targets
+            target = low.bit_length() - 1
+            targets ^= low
+            if not self.is_attacked(target, without_king, them):
+                moves.append(king_sq | target << 6)
+
+        if checkers & (checkers - 1) == 0: # Not in double check
+            if checkers:
+                checker_sq = checkers.bit_length() - 1
+                target_mask = checkers | BETWEEN[king_sq * 64 + checker_sq]
+            else:
+                target_mask = FULL & ~own
+
+            # Pinned pieces may only move along the line between the king and the pinner
+            pins = {}
+            snipers = (ROOK_RAYS[king_sq] & (bitboards[enemy_offset + ROOK] | bitboards[enemy_offset + QUEEN])) | \
+                      (BISHOP_RAYS[king_sq] & (bitboards[enemy_offset + BISHOP] | bitboards[enemy_offset + QUEEN]))
+            while snipers:
+                low = snipers & -snipers
+                sniper_sq = low.bit_length() - 1
+                snipers ^= low
+                between = BETWEEN[king_sq * 64 + sniper_sq]
+                blockers = between & occupied
+                if blockers and blockers & (blockers - 1) == 0 and blockers & own:
+                    pins[blockers.bit_length() - 1] = between | low
+
+            self._get_pawn_moves(moves, us, target_mask, pins, king_sq, occupied)
+            for piece in (KNIGHT, BISHOP, ROOK, QUEEN):
+                pieces = bitboards[offset + piece]
+                while pieces:
+                    low = pieces & -pieces
+                    sq = low.bit_length() - 1
+                    pieces ^= low
+                    if piece == KNIGHT:
+                        if sq in pins:
+                            continue
+                        targets = KNIGHT_ATTACKS[sq]
+                    elif piece == BISHOP:
+                        targets = slider_attacks(sq, occupied, BISHOP_DIRECTIONS)
+                    elif piece == ROOK:
+                        targets = slider_attacks(sq, occupied, ROOK_DIRECTIONS)
+                    else:
+                        targets = slider_attacks(sq, occupied, QUEEN_DIRECTIONS)
+                    targets &= target_mask & ~own
+                    if sq in pins:
+                        targets &= pins[sq]
+                    while targets:
+                        low = targets & -targets
+                        moves.append(sq | (low.bit_length() - 1) << 6)
+                        targets ^= low
+
+            if not checkers:
+                self._get_castle_moves(moves, king_sq, occupied, them)
+
+        if len(moves) == 0:
+            if checkers:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        else:
+            self.checkmate = False
+            self.stalemate = False
+        # Checkmate takes precedence over a fifty-move draw on the same move
+        self.draw = not self.checkmate and (self.is_threefold_repetition() or self.is_fifty_move_draw())
+
+        return moves
+
+    def _get_pawn_moves(self, moves, us, target_mask, pins, king_sq, occupied):
+        them = 1 - us
+        enemy = self.occupancy[them]
+        step, start_row = (-8, 6) if us == 0 else (8, 1)
+        ep_bit = 0
+        if self.en_passant_possible:
+            ep_bit = 1 << (self.en_passant_possible[0] * 8 + self.en_passant_possible[1])
+        pawns = self.bitboards[6 * us + PAWN]
+        while pawns:
+            low = pawns & -pawns
+            sq = low.bit_length() - 1
+            pawns ^= low
+            allowed = target_mask & pins.get(sq, FULL)
+            one = sq + step
+            if not (occupied >> one) & 1:
+                if (allowed >> one) & 1:
+                    self._add_pawn_move(moves, sq, one)
+                two = one + step
+                if sq >> 3 == start_row and not (occupied >> two) & 1 and (allowed >> two) & 1:
+                    moves.append(sq | two << 6)
+            attacks = PAWN_ATTACKS[us][sq]
+            captures = attacks & enemy & allowed
+            while captures:
+                capture = captures & -captures
+                self._add_pawn_move(moves, sq, capture.bit_length() - 1)
+                captures ^= capture
+            if attacks & ep_bit:
+                # En passant removes two pawns at once, so test the resulting position directly
+                ep_sq = ep_bit.bit_length() - 1
+                captured_bit = 1 << ((sq & 56) | (ep_sq & 7))
+                after = (occupied ^ low ^ captured_bit) | ep_bit
+                if not self.attackers_to(king_sq, after, them) & ~captured_bit:
+                    moves.append(sq | ep_sq << 6 | EN_PASSANT_FLAG)
+
+    @staticmethod
+    def _add_pawn_move(moves, sq, target):
+        code = sq | target << 6
+        if target < 8 or target >= 56: # One move per promotion piece
+            for i in range(4):
+                moves.append(code | i << 12 | PROMOTION_FLAG)
+        else:
+            moves.append(code)
+
+    def _get_castle_moves(self, moves, king_sq, occupied, them):
+        rights = self.current_castling_rights
+        if self.white_to_move:
+            kingside, queenside = rights.wks, rights.wqs
+        else:
+            kingside, queenside = rights.bks, rights.bqs
+        if kingside and not occupied & ((1 << (king_sq + 1)) | (1 << (king_sq + 2))):
+            if not self.is_attacked(king_sq + 1, occupied, them) and not self.is_attacked(king_sq + 2, occupied, them):
+                moves.append(king_sq | (king_sq + 2) << 6 | CASTLE_FLAG)
+        if queenside and not occupied & ((1 << (king_sq - 1)) | (1 << (king_sq - 2)) | (1 << (king_sq - 3))):
+            if not self.is_attacked(king_sq - 1, occupied, them) and not self.is_attacked(king_sq - 2, occupied, them):
+                moves.append(king_sq | (king_sq - 2) << 6 | CASTLE_FLAG)
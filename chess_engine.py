@@ -1,3 +1,119 @@
+import random
+from array import array
+
+import evaluation
+
+# Zobrist keys: one per piece per square, one for black to move, one per castling-rights
+# combination and one per en passant file. Seeded so every process agrees on the keys
+_zobrist_random = random.Random(2024)
+ZOBRIST_PIECES = {color + piece: [_zobrist_random.getrandbits(64) for _ in range(64)]
+                  for color in 'wb' for piece in 'PNBRQK'}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EN_PASSANT = [_zobrist_random.getrandbits(64) for _ in range(8)]
+
+# Packed move codes: bits 0-5 start square, bits 6-11 end square (both row * 8 + col), bits 12-13
+# the promotion piece's index in Move.promotion_pieces, then one flag bit each for promotion,
+# en passant and castling. Generators emit these and the search orders and stores them. make_move
+# takes either form, but still wraps a code in a Move for move_log, which undo_move, the
+# notation code and the GUI read, so each ply made costs one Move object
+PROMOTION_FLAG = 1 << 14
+EN_PASSANT_FLAG = 1 << 15
+CASTLE_FLAG = 1 << 16
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Piece numbering for the captured piece in UndoStack entries
+PIECE_CODES = ("--", "wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK")
+PIECE_CODE_INDEX = {piece: i for i, piece in enumerate(PIECE_CODES)}
+
+
+class UndoStack:
+    """
+    Preallocated history of the state a move destroys. Entry i describes the position before
+    move i: its Zobrist key, and one packed word with the castling rights (bits 0-3, as
+    CastleRights.index), the en passant file + 1 (bits 4-7, 0 for none), the piece the move
+    captured (bits 8-11, index into PIECE_CODES) and the halfmove clock (bits 12 and up).
+    Entries are overwritten in place, so making and taking back moves allocates nothing once
+    the stack has grown to the length of the game.
+    """
+    def __init__(self, capacity=256):
+        self.keys = array('Q', [0]) * capacity
+        self.states = array('L', [0]) * capacity
+        self.size = 0
+
+    def push(self, key, state):
+        size = self.size
+        if size == len(self.keys): # Double the capacity
+            self.keys.extend(self.keys)
+            self.states.extend(self.states)
+        self.keys[size] = key
+        self.states[size] = state
+        self.size = size + 1
+
+    def pop(self):
+        # (key, state) of the position before the last move
+        self.size -= 1
+        return self.keys[self.size], self.states[self.size]
+
+    def recent_keys(self, count):
+        # Keys of up to `count` positions before the current one, oldest first
+        return tuple(self.keys[max(self.size - count, 0):self.size])
+
+    def clear(self):
+        self.size = 0
+
+
+def parse_fen(fen):
+    """
+    (board, white_to_move, castling_rights, en_passant_possible, halfmove_clock, fullmove_number)
+    for a FEN string, in the form GameState.load_position takes.
+    """
+    fields = fen.split()
+    if len(fields) < 2:
+        raise ValueError(f"bad FEN {fen!r}")
+    board = []
+    for rank in fields[0].split('/'):
+        row = []
+        for char in rank:
+            if char.isdigit():
+                row.extend(["--"] * int(char))
+            elif char.upper() in "PNBRQK":
+                row.append(('w' if char.isupper() else 'b') + char.upper())
+            else:
+                raise ValueError(f"bad FEN {fen!r}")
+        if len(row) != 8:
+            raise ValueError(f"bad FEN {fen!r}")
+        board.append(row)
+    if len(board) != 8 or fields[1] not in ('w', 'b'):
+        raise ValueError(f"bad FEN {fen!r}")
+    if [sum(row.count(king) for row in board) for king in ("wK", "bK")] != [1, 1]:
+        raise ValueError(f"bad FEN {fen!r}: each side needs one king")
+    if any(piece[1] == 'P' for piece in board[0] + board[7]):
+        raise ValueError(f"bad FEN {fen!r}: pawn on the first or last rank")
+    # The side that just moved cannot have left its king in check
+    probe = GameState.__new__(GameState)
+    probe.board, probe.white_to_move = board, fields[1] == 'b'
+    king = 'wK' if probe.white_to_move else 'bK'
+    if probe.square_under_attack(*next((r, c) for r in range(8) for c in range(8) if board[r][c] == king)):
+        raise ValueError(f"bad FEN {fen!r}: the side not to move is in check")
+    # Castling rights only count while the king and that rook are on their home squares
+    castling = fields[2] if len(fields) > 2 else '-'
+    white_home, black_home = board[7][4] == 'wK', board[0][4] == 'bK'
+    rights = CastleRights('K' in castling and white_home and board[7][7] == 'wR',
+                          'k' in castling and black_home and board[0][7] == 'bR',
+                          'Q' in castling and white_home and board[7][0] == 'wR',
+                          'q' in castling and black_home and board[0][0] == 'bR')
+    en_passant = ()
+    if len(fields) > 3 and fields[3] != '-':
+        if len(fields[3]) != 2 or fields[3][0] not in Move.files_to_cols or fields[3][1] not in Move.ranks_to_rows:
+            raise ValueError(f"bad FEN {fen!r}")
+        en_passant = (Move.ranks_to_rows[fields[3][1]], Move.files_to_cols[fields[3][0]])
+    halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+    fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+    return board, fields[1] == 'w', rights, en_passant, halfmove_clock, fullmove_number
+
+
 class GameState:
     def __init__(self):
         self.board = [
@@ -18,10 +134,140 @@ class GameState:
         self.stalemate = False
         self.en_passant_possible = () # Coordinates for the square where en passant capture is possible
         self.current_castling_rights = CastleRights(True, True, True, True)
-        self.castle_rights_log = [CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                               self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
+        self.pins = {} # Pinned piece square -> pin direction, filled in by get_valid_moves
+        self.draw = False # Threefold repetition or fifty-move rule, set by get_valid_moves
+        self.halfmove_clock = 0 # Plies since the last capture or pawn move
+        self.undo_stack = UndoStack() # Irreversible state of every earlier position, alongside move_log
+        self.start_ply = 0 # Plies played before the first move in move_log, for the fullmove number
+        self.zobrist_key = self.compute_zobrist_key()
+        self.repetition_counts = {self.zobrist_key: 1}
+        # Running evaluation terms (see evaluation.py), kept up to date by make_move/undo_move
+        self.mg_score, self.eg_score, self.phase = evaluation.position_terms(self.board)
+
+    def load_position(self, board, white_to_move, castling_rights, en_passant_possible=(), halfmove_clock=0,
+                      fullmove_number=1):
+        # Replaces the whole position (board is a grid like self.board) and clears the game
+        # history. The existing board rows, castling rights and containers are reused, so
+        # resetting a GameState allocates next to nothing
+        for r in range(8):
+            self.board[r][:] = board[r]
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] == 'wK':
+                    self.white_king_location = (r, c)
+                elif self.board[r][c] == 'bK':
+                    self.black_king_location = (r, c)
+        self.white_to_move = white_to_move
+        self.move_log.clear()
+        self.checkmate = False
+        self.stalemate = False
+        self.draw = False
+        self.en_passant_possible = en_passant_possible
+        self.current_castling_rights.set_index(castling_rights.index())
+        self.halfmove_clock = halfmove_clock
+        self.start_ply = 2 * (fullmove_number - 1) + (0 if white_to_move else 1)
+        self.undo_stack.clear()
+        self.zobrist_key = self.compute_zobrist_key()
+        self.repetition_counts.clear()
+        self.repetition_counts[self.zobrist_key] = 1
+        self.mg_score, self.eg_score, self.phase = evaluation.position_terms(self.board)
+
+    @classmethod
+    def from_fen(cls, fen):
+        """
+        A new GameState set up from a FEN string.
+        """
+        return cls().load_fen(fen)
+
+    def load_fen(self, fen):
+        """
+        Resets this GameState to the position in a FEN string and returns it. The trailing
+        fields (castling, en passant, clocks) may be left out.
+        """
+        self.load_position(*parse_fen(fen))
+        return self
+
+    def to_fen(self):
+        """
+        FEN string for the current position. The en passant square is given after every
+        double pawn push, whether or not a capture is possible.
+        """
+        rows = []
+        for row in self.board:
+            text, empty = "", 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                text += piece[1] if piece[0] == 'w' else piece[1].lower()
+            rows.append(text + (str(empty) if empty else ""))
+        rights = self.current_castling_rights
+        castling = ("K" if rights.wks else "") + ("Q" if rights.wqs else "") + \
+                   ("k" if rights.bks else "") + ("q" if rights.bqs else "")
+        if self.en_passant_possible:
+            en_passant = Move.cols_to_files[self.en_passant_possible[1]] + Move.rows_to_ranks[self.en_passant_possible[0]]
+        else:
+            en_passant = "-"
+        fullmove_number = (self.start_ply + len(self.move_log)) // 2 + 1
+        return f"{'/'.join(rows)} {'w' if self.white_to_move else 'b'} {castling or '-'} {en_passant} " \
+               f"{self.halfmove_clock} {fullmove_number}"
+
+    def get_snapshot(self):
+        # Compact, picklable description of the current position for handing to other processes:
+        # one character per square, side to move, castling bits, en passant square, halfmove
+        # clock and the keys of the positions since the last irreversible move (for repetitions)
+        squares = ''.join("." if piece == "--" else (piece[1] if piece[0] == 'w' else piece[1].lower())
+                          for row in self.board for piece in row)
+        recent_keys = self.undo_stack.recent_keys(self.halfmove_clock)
+        return (squares, self.white_to_move, self.current_castling_rights.index(), self.en_passant_possible,
+                self.halfmove_clock, recent_keys)
+
+    def load_snapshot(self, snapshot):
+        squares, white_to_move, castling, en_passant, halfmove_clock, recent_keys = snapshot
+        board = [["--" if char == "." else ('w' if char.isupper() else 'b') + char.upper()
+                  for char in squares[r * 8:r * 8 + 8]] for r in range(8)]
+        rights = CastleRights(bool(castling & 1), bool(castling & 2), bool(castling & 4), bool(castling & 8))
+        self.load_position(board, white_to_move, rights, en_passant, halfmove_clock)
+        # The earlier positions only count towards repetitions; there are no moves to undo into them
+        for key in recent_keys:
+            self.undo_stack.push(key, 0)
+            self.repetition_counts[key] = self.repetition_counts.get(key, 0) + 1
+        return self
+
+    def compute_zobrist_key(self):
+        # Full rehash of the position; make_move/undo_move keep zobrist_key up to date incrementally
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][r * 8 + c]
+        if not self.white_to_move:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_CASTLING[self.current_castling_rights.index()]
+        if self.en_passant_possible:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant_possible[1]]
+        return key
 
     def make_move(self, move):
+        if not isinstance(move, Move): # Packed move code; move_log and undo_move need the Move
+            move = Move.from_code(move, self.board)
+        key = self.zobrist_key
+        rights = self.current_castling_rights.index()
+        self.undo_stack.push(key, rights | (self.en_passant_possible[1] + 1 if self.en_passant_possible else 0) << 4 |
+                             PIECE_CODE_INDEX[move.piece_captured] << 8 | self.halfmove_clock << 12)
+        key ^= ZOBRIST_CASTLING[rights] ^ ZOBRIST_BLACK_TO_MOVE
+        if self.en_passant_possible:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant_possible[1]]
+        key ^= ZOBRIST_PIECES[move.piece_moved][move.start_row * 8 + move.start_col]
+        mg, eg, phase = evaluation.move_delta(move)
+        self.mg_score += mg
+        self.eg_score += eg
+        self.phase += phase
+
         self.board[move.start_row][move.start_col] = "--"
         self.board[move.end_row][move.end_col] = move.piece_moved
         self.move_log.append(move)
@@ -32,40 +278,58 @@ class GameState:
         elif move.piece_moved == 'bK':
             self.black_king_location = (move.end_row, move.end_col)
 
-        # Pawn promotion (simplified: always promotes to Queen)
+        # Pawn promotion
         if move.is_pawn_promotion:
-            self.board[move.end_row][move.end_col] = move.piece_moved[0] + 'Q'
+            self.board[move.end_row][move.end_col] = move.piece_moved[0] + move.promotion_choice
+        key ^= ZOBRIST_PIECES[self.board[move.end_row][move.end_col]][move.end_row * 8 + move.end_col]
 
         # En Passant update
         if move.piece_moved[1] == 'P' and abs(move.start_row - move.end_row) == 2:
             self.en_passant_possible = ((move.start_row + move.end_row) // 2, move.end_col)
+            key ^= ZOBRIST_EN_PASSANT[move.end_col]
         else:
             self.en_passant_possible = ()
 
         # En Passant capture
         if move.is_en_passant_move:
-            self.board[move.end_row + (1 if move.piece_moved[0] == 'b' else -1)][move.end_col] = "--"
+            self.board[move.start_row][move.end_col] = "--" # Captured pawn sits beside the capturing pawn
+            key ^= ZOBRIST_PIECES[move.piece_captured][move.start_row * 8 + move.end_col]
+        elif move.piece_captured != "--":
+            key ^= ZOBRIST_PIECES[move.piece_captured][move.end_row * 8 + move.end_col]
 
         # Castle move
         if move.is_castle_move:
+            rook = move.piece_moved[0] + 'R'
             if move.end_col - move.start_col == 2: # Kingside castle
                 self.board[move.end_row][move.end_col - 1] = self.board[move.end_row][move.end_col + 1] # Move rook
                 self.board[move.end_row][move.end_col + 1] = "--" # Clear old rook square
+                rook_from, rook_to = move.end_col + 1, move.end_col - 1
             else: # Queenside castle
                 self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][move.end_col - 2] # Move rook
                 self.board[move.end_row][move.end_col - 2] = "--" # Clear old rook square
+                rook_from, rook_to = move.end_col - 2, move.end_col + 1
+            key ^= ZOBRIST_PIECES[rook][move.end_row * 8 + rook_from] ^ ZOBRIST_PIECES[rook][move.end_row * 8 + rook_to]
 
         # Update castling rights - whenever a King or Rook moves
         self.update_castle_rights(move)
-        self.castle_rights_log.append(CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                                   self.current_castling_rights.wqs, self.current_castling_rights.bqs))
+        key ^= ZOBRIST_CASTLING[self.current_castling_rights.index()]
+
+        # Fifty-move rule clock and repetition bookkeeping
+        if move.piece_moved[1] == 'P' or move.piece_captured != "--":
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        self.zobrist_key = key
+        self.repetition_counts[key] = self.repetition_counts.get(key, 0) + 1
 
 
     def undo_move(self):
         if self.move_log:
             move = self.move_log.pop()
+            key, state = self.undo_stack.pop()
+            captured = PIECE_CODES[(state >> 8) & 15]
             self.board[move.start_row][move.start_col] = move.piece_moved
-            self.board[move.end_row][move.end_col] = move.piece_captured
+            self.board[move.end_row][move.end_col] = captured
             self.white_to_move = not self.white_to_move
 
             if move.piece_moved == 'wK':
@@ -76,15 +340,7 @@ class GameState:
             # Undo en passant
             if move.is_en_passant_move:
                 self.board[move.end_row][move.end_col] = "--" # Remove empty square
-                self.board[move.start_row][move.end_col] = move.piece_captured # Restore captured pawn
-                self.en_passant_possible = (move.end_row, move.end_col)
-            # If the piece moved was a pawn and moved two squares, reset en_passant_possible
-            if move.piece_moved[1] == 'P' and abs(move.start_row - move.end_row) == 2:
-                self.en_passant_possible = () # This needs to be more robust, potentially checking previous moves
-
-            # Undo castling rights
-            self.castle_rights_log.pop() # Remove new castle rights from the move we are undoing
-            self.current_castling_rights = self.castle_rights_log[-1] # Set current castle rights to the previous one
+                self.board[move.start_row][move.end_col] = captured # Restore captured pawn
 
             # Undo castle move
             if move.is_castle_move:
@@ -95,6 +351,39 @@ class GameState:
                     self.board[move.end_row][move.end_col - 2] = self.board[move.end_row][move.end_col + 1]
                     self.board[move.end_row][move.end_col + 1] = "--"
 
+            # Restore the irreversible state exactly from the undo stack
+            self.current_castling_rights.set_index(state & 15)
+            en_passant_file = (state >> 4) & 15
+            self.en_passant_possible = ((2 if self.white_to_move else 5), en_passant_file - 1) if en_passant_file else ()
+            self.halfmove_clock = state >> 12
+            if self.repetition_counts[self.zobrist_key] == 1:
+                del self.repetition_counts[self.zobrist_key]
+            else:
+                self.repetition_counts[self.zobrist_key] -= 1
+            self.zobrist_key = key
+            mg, eg, phase = evaluation.move_delta(move)
+            self.mg_score -= mg
+            self.eg_score -= eg
+            self.phase -= phase
+            self.checkmate = False
+            self.stalemate = False
+            self.draw = False
+
+    def piece_on(self, sq):
+        # Piece code ("wP", "--", ...) on a square numbered row * 8 + col
+        return self.board[sq >> 3][sq & 7]
+
+    def evaluate(self):
+        # Material and piece-square score in centipawns from white's point of view, tapered by
+        # the game phase; O(1), as the terms are maintained move by move
+        return evaluation.tapered(self.mg_score, self.eg_score, self.phase)
+
+    def is_threefold_repetition(self):
+        return self.repetition_counts[self.zobrist_key] >= 3
+
+    def is_fifty_move_draw(self):
+        return self.halfmove_clock >= 100
+
 
     def update_castle_rights(self, move):
         if move.piece_moved == 'wK':
@@ -130,38 +419,65 @@ class GameState:
                     self.current_castling_rights.bqs = False
 
 
+    def move_from_code(self, code):
+        return Move.from_code(code, self.board)
+
     def get_valid_moves(self):
-        # 1. Generate all possible moves
-        moves = self.get_all_possible_moves()
-        # 2. For each move, make the move
-        # 3. Generate all opponent's moves
-        # 4. For each of opponent's moves, see if they attack the king
-        # 5. If king is attacked, it's an invalid move
-        # 6. Undo the move
-        for i in range(len(moves) - 1, -1, -1):
-            self.make_move(moves[i])
-            # For pawn promotion, need to consider the actual promoted piece for in_check
-            # For simplicity here, it treats it as original pawn, but would need to be smarter
-            self.white_to_move = not self.white_to_move # Switch turn back to check if previous player is in check
-            if self.in_check():
-                moves.remove(moves[i])
-            self.white_to_move = not self.white_to_move # Switch turn back to current player
-            self.undo_move() # Undo the move to restore board state
-
-        # Add castling moves after filtering basic valid moves
+        board = self.board
+        return [Move.from_code(code, board) for code in self.get_valid_move_codes()]
+
+    def get_valid_move_codes(self):
+        # Work out checks and pins once by scanning outward from the king, then let the
+        # piece generators emit only legal moves (no make/undo round trip per move).
+        # Returns packed move codes in an array('I')
         if self.white_to_move:
-            self.get_castle_moves(self.white_king_location[0], self.white_king_location[1], moves)
+            king_row, king_col = self.white_king_location
+        else:
+            king_row, king_col = self.black_king_location
+        self.pins, checks = self.check_for_pins_and_checks()
+
+        if len(checks) > 1: # Double check: only the king can move
+            moves = array('I')
+            self.get_king_moves(king_row, king_col, moves)
         else:
-            self.get_castle_moves(self.black_king_location[0], self.black_king_location[1], moves)
+            moves = self.get_all_possible_moves()
+            if checks: # Single check: capture the checker, block it, or move the king
+                check_row, check_col, d_row, d_col = checks[0]
+                valid_squares = set()
+                if self.board[check_row][check_col][1] == 'N': # Knight checks can't be blocked
+                    valid_squares.add(check_row * 8 + check_col)
+                else:
+                    for i in range(1, 8):
+                        square = (king_row + d_row * i) * 8 + king_col + d_col * i
+                        valid_squares.add(square)
+                        if square == check_row * 8 + check_col:
+                            break
+                king_sq = king_row * 8 + king_col
+                for i in range(len(moves) - 1, -1, -1):
+                    code = moves[i]
+                    if code & 63 == king_sq:
+                        continue
+                    end = (code >> 6) & 63
+                    if code & EN_PASSANT_FLAG:
+                        # The captured pawn sits beside the capturing pawn, not on the end square
+                        if ((code & 56) | (end & 7)) not in valid_squares and end not in valid_squares:
+                            del moves[i]
+                    elif end not in valid_squares:
+                        del moves[i]
+            else:
+                self.get_castle_moves(king_row, king_col, moves)
+        self.pins = {}
 
         if len(moves) == 0:
-            if self.in_check():
+            if checks:
                 self.checkmate = True
             else:
                 self.stalemate = True
         else:
             self.checkmate = False
             self.stalemate = False
+        # Checkmate takes precedence over a fifty-move draw on the same move
+        self.draw = not self.checkmate and (self.is_threefold_repetition() or self.is_fifty_move_draw())
 
         return moves
 
@@ -171,20 +487,88 @@ class GameState:
         else:
             return self.square_under_attack(self.black_king_location[0], self.black_king_location[1])
 
-    def square_under_attack(self, r, c):
-        # Check from perspective of current player, if the given square is attacked by opponent
-        # Temporarily switch turn to opponent to generate their moves
-        self.white_to_move = not self.white_to_move
-        opponent_moves = self.get_all_possible_moves() # This is the expensive part to optimize
-        self.white_to_move = not self.white_to_move # Switch back
+    def check_for_pins_and_checks(self):
+        # Returns (pins, checks) for the side to move. pins maps a pinned piece's square to
+        # the direction from the king towards it; checks is a list of (row, col, d_row, d_col)
+        pins = {}
+        checks = []
+        if self.white_to_move:
+            ally_color, enemy_color = 'w', 'b'
+            king_row, king_col = self.white_king_location
+        else:
+            ally_color, enemy_color = 'b', 'w'
+            king_row, king_col = self.black_king_location
+        board = self.board
+        for j, (d_row, d_col) in enumerate(self.king_directions):
+            possible_pin = ()
+            for i in range(1, 8):
+                end_row = king_row + d_row * i
+                end_col = king_col + d_col * i
+                if not (0 <= end_row < 8 and 0 <= end_col < 8):
+                    break
+                end_piece = board[end_row][end_col]
+                if end_piece == "--":
+                    continue
+                if end_piece[0] == ally_color:
+                    if possible_pin: # Second ally piece in this direction, no pin or check possible
+                        break
+                    possible_pin = (end_row, end_col)
+                    continue
+                piece_type = end_piece[1]
+                # Orthogonal directions come first in king_directions, diagonals after
+                if (j < 4 and piece_type in 'RQ') or (j >= 4 and piece_type in 'BQ') or \
+                        (i == 1 and piece_type == 'P' and j >= 4 and d_row == (1 if enemy_color == 'w' else -1)):
+                    if possible_pin:
+                        pins[possible_pin] = (d_row, d_col)
+                    else:
+                        checks.append((end_row, end_col, d_row, d_col))
+                break
+        for d_row, d_col in self.knight_offsets:
+            end_row = king_row + d_row
+            end_col = king_col + d_col
+            if 0 <= end_row < 8 and 0 <= end_col < 8:
+                end_piece = board[end_row][end_col]
+                if end_piece[0] == enemy_color and end_piece[1] == 'N':
+                    checks.append((end_row, end_col, d_row, d_col))
+        return pins, checks
 
-        for move in opponent_moves:
-            if move.end_row == r and move.end_col == c:
+    def square_under_attack(self, r, c):
+        # Check from perspective of current player, if the given square is attacked by opponent.
+        # Scans outward from the square and stops at the first attacker found
+        board = self.board
+        if self.white_to_move:
+            enemy_color, pawn_row = 'b', r - 1
+        else:
+            enemy_color, pawn_row = 'w', r + 1
+        if 0 <= pawn_row < 8:
+            enemy_pawn = enemy_color + 'P'
+            if (c > 0 and board[pawn_row][c - 1] == enemy_pawn) or \
+                    (c < 7 and board[pawn_row][c + 1] == enemy_pawn):
+                return True
+        enemy_knight = enemy_color + 'N'
+        for d_row, d_col in self.knight_offsets:
+            end_row = r + d_row
+            end_col = c + d_col
+            if 0 <= end_row < 8 and 0 <= end_col < 8 and board[end_row][end_col] == enemy_knight:
                 return True
+        for j, (d_row, d_col) in enumerate(self.king_directions):
+            sliders = 'RQ' if j < 4 else 'BQ'
+            for i in range(1, 8):
+                end_row = r + d_row * i
+                end_col = c + d_col * i
+                if not (0 <= end_row < 8 and 0 <= end_col < 8):
+                    break
+                end_piece = board[end_row][end_col]
+                if end_piece == "--":
+                    continue
+                if end_piece[0] == enemy_color and \
+                        (end_piece[1] in sliders or (i == 1 and end_piece[1] == 'K')):
+                    return True
+                break
         return False
 
     def get_all_possible_moves(self):
-        moves = []
+        moves = array('I')
         for r in range(len(self.board)):
             for c in range(len(self.board[r])):
                 turn = self.board[r][c][0]
@@ -202,110 +586,120 @@ class GameState:
         'K': lambda self, r, c, moves: self.get_king_moves(r, c, moves),
     }
 
+    # Orthogonal directions first, then diagonals (check_for_pins_and_checks relies on the order)
+    king_directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+    knight_offsets = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+
     def get_pawn_moves(self, r, c, moves):
+        pin_direction = self.pins.get((r, c))
         if self.white_to_move:
-            # 1 square pawn advance
-            if self.board[r-1][c] == "--":
-                moves.append(Move((r, c), (r-1, c), self.board))
-                # 2 square pawn advance
-                if r == 6 and self.board[r-2][c] == "--":
-                    moves.append(Move((r, c), (r-2, c), self.board))
-            # captures
-            if c-1 >= 0: # captures to the left
-                if self.board[r-1][c-1][0] == 'b':
-                    moves.append(Move((r, c), (r-1, c-1), self.board))
-                elif (r-1, c-1) == self.en_passant_possible: # en passant
-                    moves.append(Move((r, c), (r-1, c-1), self.board, is_en_passant_move=True))
-            if c+1 <= 7: # captures to the right
-                if self.board[r-1][c+1][0] == 'b':
-                    moves.append(Move((r, c), (r-1, c+1), self.board))
-                elif (r-1, c+1) == self.en_passant_possible: # en passant
-                    moves.append(Move((r, c), (r-1, c+1), self.board, is_en_passant_move=True))
-
-        else: # Black pawn moves
-            # 1 square pawn advance
-            if self.board[r+1][c] == "--":
-                moves.append(Move((r, c), (r+1, c), self.board))
+            move_amount, start_row, enemy_color = -1, 6, 'b'
+        else:
+            move_amount, start_row, enemy_color = 1, 1, 'w'
+        end_row = r + move_amount
+        # 1 square pawn advance
+        if self.board[end_row][c] == "--":
+            if pin_direction is None or pin_direction[1] == 0:
+                self._add_pawn_move(r, c, end_row, c, moves)
                 # 2 square pawn advance
-                if r == 1 and self.board[r+2][c] == "--":
-                    moves.append(Move((r, c), (r+2, c), self.board))
-            # captures
-            if c-1 >= 0: # captures to the left
-                if self.board[r+1][c-1][0] == 'w':
-                    moves.append(Move((r, c), (r+1, c-1), self.board))
-                elif (r+1, c-1) == self.en_passant_possible: # en passant
-                    moves.append(Move((r, c), (r+1, c-1), self.board, is_en_passant_move=True))
-            if c+1 <= 7: # captures to the right
-                if self.board[r+1][c+1][0] == 'w':
-                    moves.append(Move((r, c), (r+1, c+1), self.board))
-                elif (r+1, c+1) == self.en_passant_possible: # en passant
-                    moves.append(Move((r, c), (r+1, c+1), self.board, is_en_passant_move=True))
-
-    def get_rook_moves(self, r, c, moves):
-        directions = [(-1, 0), (0, -1), (1, 0), (0, 1)]
+                if r == start_row and self.board[r + 2 * move_amount][c] == "--":
+                    moves.append(r * 8 + c | (r + 2 * move_amount) * 8 + c << 6)
+        # captures
+        for d_col in (-1, 1):
+            end_col = c + d_col
+            if not 0 <= end_col <= 7:
+                continue
+            if pin_direction is not None and pin_direction != (move_amount, d_col) and \
+                    pin_direction != (-move_amount, -d_col):
+                continue
+            if self.board[end_row][end_col][0] == enemy_color:
+                self._add_pawn_move(r, c, end_row, end_col, moves)
+            elif (end_row, end_col) == self.en_passant_possible: # en passant
+                if not self._en_passant_exposes_king(r, c, end_row, end_col):
+                    moves.append(r * 8 + c | (end_row * 8 + end_col) << 6 | EN_PASSANT_FLAG)
+
+    @staticmethod
+    def _add_pawn_move(r, c, end_row, end_col, moves):
+        code = r * 8 + c | (end_row * 8 + end_col) << 6
+        if end_row == 0 or end_row == 7: # One move per promotion piece
+            for i in range(4):
+                moves.append(code | i << 12 | PROMOTION_FLAG)
+        else:
+            moves.append(code)
+
+    def _en_passant_exposes_king(self, r, c, end_row, end_col):
+        # En passant removes two pawns from the same rank, which the pin scan can't see,
+        # so test it directly on the board (rare enough not to matter for speed)
+        board = self.board
+        pawn = board[r][c]
+        captured = board[r][end_col]
+        board[r][c] = "--"
+        board[r][end_col] = "--"
+        board[end_row][end_col] = pawn
+        exposed = self.in_check()
+        board[end_row][end_col] = "--"
+        board[r][end_col] = captured
+        board[r][c] = pawn
+        return exposed
+
+    def _get_slider_moves(self, r, c, moves, directions):
+        pin_direction = self.pins.get((r, c))
         enemy_color = 'b' if self.white_to_move else 'w'
+        board = self.board
+        start = r * 8 + c
         for d in directions:
+            if pin_direction is not None and pin_direction != d and pin_direction != (-d[0], -d[1]):
+                continue
             for i in range(1, 8):
                 end_row = r + d[0] * i
                 end_col = c + d[1] * i
                 if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    end_piece = self.board[end_row][end_col]
+                    end_piece = board[end_row][end_col]
                     if end_piece == "--":
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
+                        moves.append(start | (end_row * 8 + end_col) << 6)
                     elif end_piece[0] == enemy_color:
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
+                        moves.append(start | (end_row * 8 + end_col) << 6)
                         break
                     else:
                         break
                 else:
                     break
 
+    def get_rook_moves(self, r, c, moves):
+        self._get_slider_moves(r, c, moves, self.king_directions[:4])
+
     def get_knight_moves(self, r, c, moves):
-        knight_moves = [(-2, -1), (-1, -2), (-2, 1), (-1, 2),
-                        (1, -2), (2, -1), (1, 2), (2, 1)]
+        if (r, c) in self.pins: # A pinned knight can never move
+            return
         ally_color = 'w' if self.white_to_move else 'b'
-        for m in knight_moves:
+        for m in self.knight_offsets:
             end_row = r + m[0]
             end_col = c + m[1]
             if 0 <= end_row < 8 and 0 <= end_col < 8:
                 end_piece = self.board[end_row][end_col]
                 if end_piece[0] != ally_color:
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
+                    moves.append(r * 8 + c | (end_row * 8 + end_col) << 6)
 
     def get_bishop_moves(self, r, c, moves):
-        directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-        enemy_color = 'b' if self.white_to_move else 'w'
-        for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece == "--":
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                    elif end_piece[0] == enemy_color:
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                        break
-                    else:
-                        break
-                else:
-                    break
+        self._get_slider_moves(r, c, moves, self.king_directions[4:])
 
     def get_queen_moves(self, r, c, moves):
         self.get_rook_moves(r, c, moves)
         self.get_bishop_moves(r, c, moves)
 
     def get_king_moves(self, r, c, moves):
-        king_moves = [(-1, -1), (-1, 0), (-1, 1), (0, -1),
-                      (0, 1), (1, -1), (1, 0), (1, 1)]
         ally_color = 'w' if self.white_to_move else 'b'
-        for i in range(8):
-            end_row = r + king_moves[i][0]
-            end_col = c + king_moves[i][1]
+        king = self.board[r][c]
+        # Lift the king off the board so sliders attacking through its square are seen
+        self.board[r][c] = "--"
+        for d_row, d_col in self.king_directions:
+            end_row = r + d_row
+            end_col = c + d_col
             if 0 <= end_row < 8 and 0 <= end_col < 8:
                 end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
+                if end_piece[0] != ally_color and not self.square_under_attack(end_row, end_col):
+                    moves.append(r * 8 + c | (end_row * 8 + end_col) << 6)
+        self.board[r][c] = king
 
     def get_castle_moves(self, r, c, moves):
         if self.in_check():
@@ -320,12 +714,12 @@ class GameState:
     def _get_kingside_castle_moves(self, r, c, moves):
         if self.board[r][c+1] == "--" and self.board[r][c+2] == "--":
             if not self.square_under_attack(r, c+1) and not self.square_under_attack(r, c+2):
-                moves.append(Move((r, c), (r, c+2), self.board, is_castle_move=True))
+                moves.append(r * 8 + c | (r * 8 + c + 2) << 6 | CASTLE_FLAG)
 
     def _get_queenside_castle_moves(self, r, c, moves):
         if self.board[r][c-1] == "--" and self.board[r][c-2] == "--" and self.board[r][c-3] == "--":
             if not self.square_under_attack(r, c-1) and not self.square_under_attack(r, c-2):
-                moves.append(Move((r, c), (r, c-2), self.board, is_castle_move=True))
+                moves.append(r * 8 + c | (r * 8 + c - 2) << 6 | CASTLE_FLAG)
 
 
 class CastleRights:
@@ -335,25 +729,66 @@ class CastleRights:
         self.wqs = wqs # white queenside
         self.bqs = bqs # black queenside
 
+    def index(self):
+        # 4-bit number for the rights, used to pick a Zobrist key
+        return self.wks | self.bks << 1 | self.wqs << 2 | self.bqs << 3
+
+    def set_index(self, index):
+        # Inverse of index(), updating these rights in place
+        self.wks = bool(index & 1)
+        self.bks = bool(index & 2)
+        self.wqs = bool(index & 4)
+        self.bqs = bool(index & 8)
+
 class Move:
+    # Moves are built only for the move log and callers of get_valid_moves; generators and
+    # search work with packed move codes, so keep the wrapper free of a per-instance __dict__
+    __slots__ = ('start_row', 'start_col', 'end_row', 'end_col', 'piece_moved', 'piece_captured',
+                 'is_pawn_promotion', 'promotion_choice', 'is_en_passant_move', 'is_castle_move',
+                 'move_id', 'code')
+
     ranks_to_rows = {"1": 7, "2": 6, "3": 5, "4": 4,
                      "5": 3, "6": 2, "7": 1, "8": 0}
     rows_to_ranks = {v: k for k, v in ranks_to_rows.items()}
     files_to_cols = {"a": 0, "b": 1, "c": 2, "d": 3,
                      "e": 4, "f": 5, "g": 6, "h": 7}
     cols_to_files = {v: k for k, v in files_to_cols.items()}
-
-    def __init__(self, start_sq, end_sq, board, is_en_passant_move=False, is_castle_move=False):
+    promotion_pieces = ('Q', 'R', 'B', 'N')
+
+    def __init__(self, start_sq, end_sq, board, is_en_passant_move=False, is_castle_move=False,
+                 promotion_choice='Q'):
+        self._set_up(start_sq, end_sq, board[start_sq[0]][start_sq[1]], board[end_sq[0]][end_sq[1]],
+                     is_en_passant_move, is_castle_move, promotion_choice)
+
+    @classmethod
+    def from_code(cls, code, board):
+        # Wraps a packed move code, reading the pieces involved from a board grid
+        start, end = code & 63, (code >> 6) & 63
+        return cls.from_pieces(code, board[start >> 3][start & 7], board[end >> 3][end & 7])
+
+    @classmethod
+    def from_pieces(cls, code, piece_moved, piece_captured):
+        # Wraps a packed move code for backends that know the pieces but have no board grid
+        move = cls.__new__(cls)
+        start, end = code & 63, (code >> 6) & 63
+        move._set_up((start >> 3, start & 7), (end >> 3, end & 7), piece_moved, piece_captured,
+                     bool(code & EN_PASSANT_FLAG), bool(code & CASTLE_FLAG),
+                     cls.promotion_pieces[(code >> 12) & 3])
+        return move
+
+    def _set_up(self, start_sq, end_sq, piece_moved, piece_captured, is_en_passant_move, is_castle_move,
+                promotion_choice):
         self.start_row = start_sq[0]
         self.start_col = start_sq[1]
         self.end_row = end_sq[0]
         self.end_col = end_sq[1]
-        self.piece_moved = board[self.start_row][self.start_col]
-        self.piece_captured = board[self.end_row][self.end_col]
+        self.piece_moved = piece_moved
+        self.piece_captured = piece_captured
 
         # Pawn promotion flag
         self.is_pawn_promotion = (self.piece_moved == 'wP' and self.end_row == 0) or \
                                  (self.piece_moved == 'bP' and self.end_row == 7)
+        self.promotion_choice = promotion_choice if self.is_pawn_promotion else None
 
         # En passant flag
         self.is_en_passant_move = is_en_passant_move
@@ -364,12 +799,23 @@ class Move:
         self.is_castle_move = is_castle_move
 
         self.move_id = self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col
+        self.code = self.start_row * 8 + self.start_col | (self.end_row * 8 + self.end_col) << 6
+        if self.is_pawn_promotion: # Queen promotions keep the plain id, so a clicked move matches them
+            self.move_id += self.promotion_pieces.index(promotion_choice) * 10000
+            self.code |= self.promotion_pieces.index(promotion_choice) << 12 | PROMOTION_FLAG
+        if is_en_passant_move:
+            self.code |= EN_PASSANT_FLAG
+        if is_castle_move:
+            self.code |= CASTLE_FLAG
 
     def __eq__(self, other):
         return isinstance(other, Move) and self.move_id == other.move_id
 
     def get_chess_notation(self):
-        return self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col)
+        notation = self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col)
+        if self.is_pawn_promotion:
+            notation += self.promotion_choice.lower()
+        return notation
 
     def get_rank_file(self, r, c):
-        return self.cols_to_files[c] + self.rows_to_ranks[r]
\ No newline at end of file
+        return self.cols_to_files[c] + self.rows_to_ranks[r]
@@ -0,0 +1,168 @@
+"""
+Material and piece-square evaluation, tapered between the middlegame and the endgame.
+
+GameState keeps the three running terms (mg_score, eg_score, phase) up to date in make_move
+and undo_move with move_delta, so reading the evaluation costs O(1) instead of a board scan.
+Scores are in centipawns from white's point of view. The tables follow the "simplified
+evaluation function" (Michniewski), with separate endgame tables for pawns and the king.
+
+    mg, eg, phase = evaluation.position_terms(gs.board)
+    score = evaluation.tapered(mg, eg, phase)
+"""
+MG_VALUES = {'P': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0}
+EG_VALUES = {'P': 120, 'N': 300, 'B': 320, 'R': 520, 'Q': 930, 'K': 0}
+# Game phase: 24 with all pieces on the board, falling to 0 as minors, rooks and queens go
+PHASE_WEIGHTS = {'P': 0, 'N': 1, 'B': 1, 'R': 2, 'Q': 4, 'K': 0}
+MAX_PHASE = 24
+
+# Piece-square tables for white, row 0 being rank 8 (the same orientation as GameState.board)
+PAWN_TABLE = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+)
+PAWN_ENDGAME_TABLE = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     15,  15,  15,  15,  15,  15,  15,  15,
+      5,   5,   5,   5,   5,   5,   5,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0,
+)
+KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+ROOK_TABLE = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0,
+)
+QUEEN_TABLE = (
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+)
+KING_TABLE = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20,
+)
+KING_ENDGAME_TABLE = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+)
+MG_TABLES = {'P': PAWN_TABLE, 'N': KNIGHT_TABLE, 'B': BISHOP_TABLE, 'R': ROOK_TABLE, 'Q': QUEEN_TABLE,
+             'K': KING_TABLE}
+EG_TABLES = {'P': PAWN_ENDGAME_TABLE, 'N': KNIGHT_TABLE, 'B': BISHOP_TABLE, 'R': ROOK_TABLE, 'Q': QUEEN_TABLE,
+             'K': KING_ENDGAME_TABLE}
+
+
+def _signed_tables(values, tables):
+    # Material plus table value for every piece code and square (row * 8 + col), negated for
+    # black, whose tables are the white ones turned upside down
+    signed = {}
+    for kind, table in tables.items():
+        signed['w' + kind] = [values[kind] + table[sq] for sq in range(64)]
+        signed['b' + kind] = [-(values[kind] + table[sq ^ 56]) for sq in range(64)]
+    return signed
+
+
+MG = _signed_tables(MG_VALUES, MG_TABLES)
+EG = _signed_tables(EG_VALUES, EG_TABLES)
+PHASE = {color + kind: weight for kind, weight in PHASE_WEIGHTS.items() for color in 'wb'}
+
+
+def position_terms(board):
+    """
+    (mg_score, eg_score, phase) for a board grid, by a full scan.
+    """
+    mg = eg = phase = 0
+    for r, row in enumerate(board):
+        for c, piece in enumerate(row):
+            if piece != "--":
+                mg += MG[piece][r * 8 + c]
+                eg += EG[piece][r * 8 + c]
+                phase += PHASE[piece]
+    return mg, eg, phase
+
+
+def move_delta(move):
+    """
+    Change in (mg_score, eg_score, phase) made by a move, including the captured piece (on its
+    own square for en passant), the promoted piece and the castling rook.
+    """
+    start = move.start_row * 8 + move.start_col
+    end = move.end_row * 8 + move.end_col
+    moved = move.piece_moved
+    placed = moved[0] + move.promotion_choice if move.is_pawn_promotion else moved
+    mg = MG[placed][end] - MG[moved][start]
+    eg = EG[placed][end] - EG[moved][start]
+    phase = PHASE[placed] - PHASE[moved]
+    captured = move.piece_captured
+    if captured != "--":
+        captured_sq = move.start_row * 8 + move.end_col if move.is_en_passant_move else end
+        mg -= MG[captured][captured_sq]
+        eg -= EG[captured][captured_sq]
+        phase -= PHASE[captured]
+    if move.is_castle_move:
+        rook = moved[0] + 'R'
+        if move.end_col - move.start_col == 2: # Kingside
+            rook_from, rook_to = end + 1, end - 1
+        else: # Queenside
+            rook_from, rook_to = end - 2, end + 1
+        mg += MG[rook][rook_to] - MG[rook][rook_from]
+        eg += EG[rook][rook_to] - EG[rook][rook_from]
+    return mg, eg, phase
+
+
+def tapered(mg, eg, phase):
+    """
+    Blends the middlegame and endgame scores by the game phase.
+    """
+    phase = min(phase, MAX_PHASE)
+    return (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
@@ -0,0 +1,200 @@
+"""
+Batch position features with NumPy.
+
+pack() turns many positions, given as FEN strings or GameState snapshots, into one (N, 8, 8)
+int8 array (0 empty, 1-6 white P N B R Q K, negated for black, row 0 being rank 8 as in
+GameState.board). compute() then works out the features for the whole batch at once with
+array operations, so scoring a large dataset never loops over positions in Python:
+
+    material         (N, 2, 6) piece counts per side (0 white, 1 black) in P N B R Q K order
+    material_balance (N,) white minus black in centipawns
+    attacks          (N, 2, 8, 8) number of each side's pieces attacking every square
+    mobility         (N, 2) squares the knights, bishops, rooks and queens can move to
+    king_attacks     (N, 2) enemy attacks on the squares around each side's king
+    pawn_shield      (N, 2) own pawns on the three files in front of the king, one or two ranks up
+    passed_pawns, isolated_pawns, doubled_pawns   (N, 2, 8, 8) masks
+
+Attacks and mobility are pseudo-legal: pins and checks are ignored, and sliders stop at the
+first piece in each direction.
+
+    boards, white_to_move = features.pack(fens)
+    batch = features.compute(boards)
+    python features.py positions.fen --out features.npz
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import evaluation
+
+PIECE_LETTERS = "PNBRQK"
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(1, 7) # Values of the white pieces in a packed board
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+ORTHOGONALS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+DIAGONALS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+FORWARD = (-1, 1) # Row step of a pawn advance for white and black
+
+# Square character (as in GameState snapshots, '.' for empty) -> packed value
+_SQUARE_VALUES = np.zeros(256, dtype=np.int8)
+for _i, _letter in enumerate(PIECE_LETTERS, 1):
+    _SQUARE_VALUES[ord(_letter)] = _i
+    _SQUARE_VALUES[ord(_letter.lower())] = -_i
+# FEN placement field -> the 64 snapshot characters
+_EXPAND_FEN = str.maketrans({**{str(n): "." * n for n in range(1, 9)}, "/": None})
+_MATERIAL_VALUES = np.array([evaluation.MG_VALUES[letter] for letter in PIECE_LETTERS], dtype=np.int32)
+
+
+def pack(positions):
+    """
+    (boards, white_to_move) for a sequence of FEN strings and/or GameState snapshots: an
+    (N, 8, 8) int8 array and an (N,) bool array.
+    """
+    squares = []
+    white_to_move = np.empty(len(positions), dtype=bool)
+    for i, position in enumerate(positions):
+        if isinstance(position, str):
+            fields = position.split()
+            placement = fields[0].translate(_EXPAND_FEN)
+            if len(placement) != 64:
+                raise ValueError(f"bad FEN placement {fields[0]!r}")
+            squares.append(placement)
+            white_to_move[i] = len(fields) < 2 or fields[1] == "w"
+        else:
+            squares.append(position[0])
+            white_to_move[i] = position[1]
+    raw = np.frombuffer("".join(squares).encode("ascii"), dtype=np.uint8)
+    return _SQUARE_VALUES[raw].reshape(len(positions), 8, 8), white_to_move
+
+
+def _shift(mask, d_row, d_col):
+    # out[:, r, c] = mask[:, r - d_row, c - d_col], with squares shifted in from off the board empty
+    out = np.zeros_like(mask)
+    out[:, max(d_row, 0):8 + min(d_row, 0), max(d_col, 0):8 + min(d_col, 0)] = \
+        mask[:, max(-d_row, 0):8 + min(-d_row, 0), max(-d_col, 0):8 + min(-d_col, 0)]
+    return out
+
+
+def _slider_attacks(sources, empty, directions):
+    # Attacker counts from the sliders on `sources`; each ray runs on through empty squares only
+    counts = np.zeros(sources.shape, dtype=np.uint8)
+    for d_row, d_col in directions:
+        ray = sources
+        for _ in range(7):
+            ray = _shift(ray, d_row, d_col)
+            counts += ray
+            ray = ray & empty
+            if not ray.any():
+                break
+    return counts
+
+
+def _leaper_attacks(sources, offsets):
+    counts = np.zeros(sources.shape, dtype=np.uint8)
+    for d_row, d_col in offsets:
+        counts += _shift(sources, d_row, d_col)
+    return counts
+
+
+def _adjacent_files(files):
+    # For (N, 8) per-file values: the maximum over the file to the left and the one to the right
+    out = np.zeros_like(files)
+    out[:, 1:] = files[:, :-1]
+    out[:, :-1] = np.maximum(out[:, :-1], files[:, 1:])
+    return out
+
+
+def compute(boards):
+    """
+    Features of every position in a packed (N, 8, 8) batch, as a dict of arrays (see the
+    module docstring for the shapes).
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+    n = len(boards)
+    empty = boards == 0
+    kinds = np.abs(boards)
+    sides = (boards > 0, boards < 0)
+    material = np.zeros((n, 2, 6), dtype=np.int16)
+    attacks = np.zeros((n, 2, 8, 8), dtype=np.uint8)
+    mobility = np.zeros((n, 2), dtype=np.int16)
+    king_attacks = np.zeros((n, 2), dtype=np.int16)
+    pawn_shield = np.zeros((n, 2), dtype=np.int16)
+    passed = np.zeros((n, 2, 8, 8), dtype=bool)
+    isolated = np.zeros((n, 2, 8, 8), dtype=bool)
+    doubled = np.zeros((n, 2, 8, 8), dtype=bool)
+
+    pieces = [[sides[side] & (kinds == kind) for kind in range(1, 7)] for side in (0, 1)]
+    for side in (0, 1):
+        pawns, knights, bishops, rooks, queens, kings = pieces[side]
+        material[:, side] = np.stack([mask.sum(axis=(1, 2)) for mask in pieces[side]], axis=1)
+        pawn_attacks = _leaper_attacks(pawns, ((FORWARD[side], -1), (FORWARD[side], 1)))
+        piece_attacks = _leaper_attacks(knights, KNIGHT_OFFSETS) + \
+            _slider_attacks(rooks | queens, empty, ORTHOGONALS) + \
+            _slider_attacks(bishops | queens, empty, DIAGONALS)
+        attacks[:, side] = pawn_attacks + piece_attacks + _leaper_attacks(kings, ORTHOGONALS + DIAGONALS)
+        # Each attacked square counts once per attacker, unless it holds one of our own pieces
+        mobility[:, side] = (piece_attacks * ~sides[side]).sum(axis=(1, 2))
+
+    for side in (0, 1):
+        enemy = 1 - side
+        pawns, kings = pieces[side][PAWN - 1], pieces[side][KING - 1]
+        zone = kings | _leaper_attacks(kings, ORTHOGONALS + DIAGONALS).astype(bool)
+        king_attacks[:, side] = (attacks[:, enemy] * zone).sum(axis=(1, 2))
+        front = _shift(kings, FORWARD[side], -1) | _shift(kings, FORWARD[side], 0) | _shift(kings, FORWARD[side], 1)
+        front |= _shift(front, FORWARD[side], 0)
+        pawn_shield[:, side] = (pawns & front).sum(axis=(1, 2))
+
+        # Pawn structure. Files are the last axis, rows the middle one
+        file_counts = pawns.sum(axis=1) # (N, 8)
+        doubled[:, side] = pawns & (file_counts > 1)[:, None, :]
+        isolated[:, side] = pawns & (_adjacent_files(file_counts) == 0)[:, None, :]
+        # Enemy pawns strictly ahead on the same or an adjacent file stop a pawn being passed
+        enemy_pawns = pieces[enemy][PAWN - 1]
+        if side == 0: # White moves towards row 0: "ahead" means a smaller row
+            seen = np.logical_or.accumulate(enemy_pawns, axis=1)
+            ahead = np.zeros_like(seen)
+            ahead[:, 1:] = seen[:, :-1]
+        else:
+            seen = np.logical_or.accumulate(enemy_pawns[:, ::-1], axis=1)[:, ::-1]
+            ahead = np.zeros_like(seen)
+            ahead[:, :-1] = seen[:, 1:]
+        blocked = ahead | _shift(ahead, 0, -1) | _shift(ahead, 0, 1)
+        passed[:, side] = pawns & ~blocked
+
+    return {
+        "material": material,
+        "material_balance": (material[:, 0] - material[:, 1]).astype(np.int32) @ _MATERIAL_VALUES,
+        "attacks": attacks,
+        "mobility": mobility,
+        "king_attacks": king_attacks,
+        "pawn_shield": pawn_shield,
+        "passed_pawns": passed,
+        "isolated_pawns": isolated,
+        "doubled_pawns": doubled,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute batch features for a file of FEN positions.")
+    parser.add_argument("path", help="one FEN per line")
+    parser.add_argument("--out", metavar="PATH", help="save the boards and features to PATH (.npz)")
+    parser.add_argument("--chunk", type=int, default=65536, help="positions computed at a time")
+    args = parser.parse_args(argv)
+    with open(args.path) as f:
+        fens = [line.strip() for line in f if line.strip()]
+    start = time.perf_counter()
+    boards, white_to_move = pack(fens)
+    packed = time.perf_counter()
+    chunks = [compute(boards[i:i + args.chunk]) for i in range(0, len(boards), args.chunk)]
+    batch = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]} if chunks else {}
+    seconds = time.perf_counter() - start
+    print(f"{len(fens)} positions  pack {packed - start:.3f}s  features {seconds - (packed - start):.3f}s  "
+          f"{len(fens) / seconds if seconds > 0 else 0:.0f} positions/s")
+    if args.out:
+        np.savez_compressed(args.out, boards=boards, white_to_move=white_to_move, **batch)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
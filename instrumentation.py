@@ -0,0 +1,162 @@
+"""
+Opt-in instrumentation for the rules engine.
+
+enable() puts counting and timing versions of the hot GameState methods onto the class, and
+disable() puts the original functions back. Nothing is wrapped while instrumentation is off,
+so it costs nothing unless it is switched on.
+
+    stats = instrumentation.enable(dump_interval=10)
+    perft.perft(gs, 4)
+    instrumentation.disable()
+    print(stats.report())
+
+Times are inclusive: get_king_moves includes its square_under_attack calls, and
+get_all_possible_moves includes the piece generators. A generator called from inside another
+one (get_queen_moves runs the rook and bishop generators) is counted once, as the outer call.
+"""
+import collections
+import functools
+import sys
+import threading
+import time
+
+import chess_engine
+
+METHODS = ("get_all_possible_moves", "square_under_attack", "make_move", "undo_move")
+# Piece generators and the piece type their moves are counted under
+GENERATORS = {
+    "get_pawn_moves": 'P',
+    "get_knight_moves": 'N',
+    "get_bishop_moves": 'B',
+    "get_rook_moves": 'R',
+    "get_queen_moves": 'Q',
+    "get_king_moves": 'K',
+    "get_castle_moves": 'K',
+}
+
+_originals = {} # (class, method name) -> original function while instrumentation is on
+_active = None # (stats, dump stop event) while instrumentation is on
+
+
+class EngineStats:
+    def __init__(self):
+        self.calls = collections.Counter() # Method name -> number of calls
+        self.seconds = collections.defaultdict(float) # Method name -> total seconds inside it
+        self.moves_by_piece = collections.Counter() # Piece type -> pseudo-legal moves generated
+        self.started = time.perf_counter()
+        self._in_generator = False
+
+    def reset(self):
+        self.calls.clear()
+        self.seconds.clear()
+        self.moves_by_piece.clear()
+        self.started = time.perf_counter()
+
+    def as_dict(self):
+        return {
+            "elapsed": round(time.perf_counter() - self.started, 4),
+            "calls": dict(self.calls),
+            "seconds": {name: round(seconds, 6) for name, seconds in self.seconds.items()},
+            "moves_by_piece": dict(self.moves_by_piece),
+        }
+
+    def report(self):
+        lines = [f"engine stats after {time.perf_counter() - self.started:.2f}s"]
+        for name in sorted(self.calls, key=lambda name: -self.seconds[name]):
+            calls, seconds = self.calls[name], self.seconds[name]
+            lines.append(f"  {name:<24} {calls:>10} calls  {seconds:9.3f}s  {seconds / calls * 1e6:8.2f} us/call")
+        if self.moves_by_piece:
+            lines.append("  moves generated: " + "  ".join(
+                f"{piece} {self.moves_by_piece[piece]}" for piece in "PNBRQK" if piece in self.moves_by_piece))
+        return "\n".join(lines)
+
+
+def _timed(name, function, stats):
+    calls, seconds, clock = stats.calls, stats.seconds, time.perf_counter
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            calls[name] += 1
+            seconds[name] += clock() - start
+    return wrapper
+
+
+def _timed_generator(name, piece, function, stats):
+    calls, seconds, moves_by_piece, clock = stats.calls, stats.seconds, stats.moves_by_piece, time.perf_counter
+
+    @functools.wraps(function)
+    def wrapper(self, r, c, moves):
+        if stats._in_generator: # Called by another generator, which is already being measured
+            return function(self, r, c, moves)
+        stats._in_generator = True
+        generated = len(moves)
+        start = clock()
+        try:
+            return function(self, r, c, moves)
+        finally:
+            calls[name] += 1
+            seconds[name] += clock() - start
+            moves_by_piece[piece] += len(moves) - generated
+            stats._in_generator = False
+    return wrapper
+
+
+def _dump_periodically(stats, interval, dump, stop):
+    while not stop.wait(interval):
+        dump(stats)
+
+
+def _print_report(stats):
+    print(stats.report(), file=sys.stderr, flush=True)
+
+
+def enable(classes=(chess_engine.GameState,), stats=None, dump_interval=None, dump=_print_report):
+    """
+    Starts instrumenting the given GameState classes and returns the EngineStats being filled
+    in. Methods a class does not define itself are left alone. With dump_interval, dump(stats)
+    is called every dump_interval seconds from a background thread until disable().
+    """
+    global _active
+    if _active is not None:
+        disable()
+    stats = stats or EngineStats()
+    for cls in classes:
+        for name in METHODS + tuple(GENERATORS):
+            if name not in vars(cls):
+                continue
+            original = vars(cls)[name]
+            _originals[(cls, name)] = original
+            if name in GENERATORS:
+                setattr(cls, name, _timed_generator(name, GENERATORS[name], original, stats))
+            else:
+                setattr(cls, name, _timed(name, original, stats))
+    stop = threading.Event()
+    if dump_interval:
+        threading.Thread(target=_dump_periodically, args=(stats, dump_interval, dump, stop), daemon=True).start()
+    _active = (stats, stop)
+    return stats
+
+
+def disable():
+    """
+    Restores the original methods and returns the stats that were collected (None if
+    instrumentation was off).
+    """
+    global _active
+    if _active is None:
+        return None
+    stats, stop = _active
+    stop.set()
+    for (cls, name), original in _originals.items():
+        setattr(cls, name, original)
+    _originals.clear()
+    _active = None
+    return stats
+
+
+def is_enabled():
+    return _active is not None
@@ -1,44 +1,141 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import pygame as p
+import bitbases
 import chess_engine
+import polyglot
+import search
 
 WIDTH = HEIGHT = 512
+MOVE_LOG_PANEL_WIDTH = 200
+EVAL_PANEL_HEIGHT = 24 # Running evaluation, shown under the move log
+MOVE_LOG_PANEL_HEIGHT = HEIGHT - EVAL_PANEL_HEIGHT
 DIMENSION = 8
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15
 IMAGES = {}
+FONTS = {}
+PIECES = ('wP', 'wR', 'wN', 'wB', 'wQ', 'wK', 'bP', 'bR', 'bN', 'bB', 'bQ', 'bK')
+IMAGE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+ATLAS_DIRECTORY = os.path.join(IMAGE_DIRECTORY, "cache") # Pre-scaled sprite atlases, one per square size
+ATLASES = {} # Square size -> atlas surface, kept so switching board sizes never reloads anything
+GAME_STATE = chess_engine.GameState # bitboard_engine.BitboardGameState is a drop-in alternative
+PLAYER_ONE = True # True if a human plays white, False if the computer does
+PLAYER_TWO = False # Same for black
+ENGINE_MOVETIME = 1.0 # Seconds the computer may think per move
+OPENING_BOOK = None # Path to a Polyglot .bin book the computer plays from while it can
+
+def load_images(sq_size=SQ_SIZE):
+    """
+    Points IMAGES at the piece sprites for one square size. All twelve pieces live side by
+    side in a single atlas surface; IMAGES holds subsurfaces of it, so nothing is copied.
+    """
+    atlas = ATLASES.get(sq_size)
+    if atlas is None:
+        atlas = ATLASES[sq_size] = load_atlas(sq_size)
+    for i, piece in enumerate(PIECES):
+        IMAGES[piece] = atlas.subsurface(p.Rect(i * sq_size, 0, sq_size, sq_size))
+
+def load_atlas(sq_size):
+    """
+    The sprite atlas for one square size, read from the disk cache when it was built from the
+    current piece images, otherwise scaled from them and cached. The cache file name carries
+    the size and a signature of the sources, so changing an image invalidates it.
+    """
+    sources = [os.path.join(IMAGE_DIRECTORY, piece.lower() + ".png") for piece in PIECES]
+    signature = hashlib.sha1(repr([(os.path.basename(source), os.stat(source).st_mtime_ns, os.stat(source).st_size)
+                                   for source in sources]).encode()).hexdigest()[:12]
+    prefix = f"atlas-{sq_size}-"
+    path = os.path.join(ATLAS_DIRECTORY, prefix + signature + ".png")
+    if os.path.exists(path):
+        try:
+            return p.image.load(path).convert_alpha()
+        except p.error:
+            pass # Damaged cache file: build it again
+    atlas = p.Surface((sq_size * len(PIECES), sq_size), p.SRCALPHA)
+    for i, source in enumerate(sources):
+        atlas.blit(p.transform.scale(p.image.load(source), (sq_size, sq_size)), (i * sq_size, 0))
+    atlas = atlas.convert_alpha()
+    try:
+        os.makedirs(ATLAS_DIRECTORY, exist_ok=True)
+        for name in os.listdir(ATLAS_DIRECTORY): # Atlases of this size built from older images
+            if name.startswith(prefix):
+                os.remove(os.path.join(ATLAS_DIRECTORY, name))
+        temporary = path[:-len(".png")] + ".tmp.png" # Written aside first so a crash never leaves half a file
+        p.image.save(atlas, temporary)
+        os.replace(temporary, path)
+    except (OSError, p.error):
+        pass # Read-only checkout: keep the atlas in memory only
+    return atlas
+
+def load_fonts():
+    """
+    Creates the fonts once; SysFont looks fonts up on the system, which is too slow to repeat.
+    """
+    if not FONTS:
+        FONTS["move_log"] = p.font.SysFont("Arial", 14, False, False)
+        FONTS["thinking"] = p.font.SysFont("Arial", 14, True, False)
+        FONTS["end_game"] = p.font.SysFont("Helvetica", 32, True, False)
+
+def find_valid_moves(snapshot):
+    """
+    Background job: legal moves and game-over flags for a position, computed on a private copy
+    so the render loop can keep reading the real GameState. Endgames the bitbases know to be
+    drawn count as a draw.
+    """
+    worker_gs = GAME_STATE().load_snapshot(snapshot)
+    moves = worker_gs.get_valid_moves()
+    draw = worker_gs.draw or (bool(moves) and bitbases.probe(worker_gs) == 0)
+    return moves, worker_gs.checkmate, worker_gs.stalemate, draw
 
-def load_images():
-    pieces = ['wP', 'wR', 'wN', 'wB', 'wQ', 'wK',
-              'bP', 'bR', 'bN', 'bB', 'bQ', 'bK']
-    for piece in pieces:
-        # Using convert_alpha for better performance with transparent backgrounds if images have them
-        IMAGES[piece] = p.transform.scale(
-            p.image.load("images/" + piece + ".png").convert_alpha(), (SQ_SIZE, SQ_SIZE))
+def find_computer_move(searcher, book, snapshot):
+    """
+    Background job: the computer's reply, found on a private copy of the position. Book moves
+    are played instantly; the search only runs once the game has left the book.
+    """
+    worker_gs = GAME_STATE().load_snapshot(snapshot)
+    if book is not None:
+        move = book.choose_move(worker_gs)
+        if move is not None:
+            return move
+    return searcher.search(worker_gs, movetime=ENGINE_MOVETIME).best_move
 
 def main():
     p.init()
-    screen = p.display.set_mode((WIDTH, HEIGHT))
+    screen = p.display.set_mode((WIDTH + MOVE_LOG_PANEL_WIDTH, HEIGHT))
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
-    gs = chess_engine.GameState()
-    valid_moves = gs.get_valid_moves()
+    gs = GAME_STATE()
+    # Move generation and the computer's search run on one background thread so the window
+    # keeps drawing; the loop polls the pending futures every frame
+    worker = ThreadPoolExecutor(max_workers=1)
+    searcher = search.Searcher()
+    book = polyglot.PolyglotBook(OPENING_BOOK) if OPENING_BOOK else None
+    pending_moves = worker.submit(find_valid_moves, gs.get_snapshot())
+    pending_search = None
+    valid_moves = []
     move_made = False
     load_images()
     running = True
     sq_selected = ()  # No square is selected initially, keeps track of the last click (row, col)
     player_clicks = []  # Keeps track of player clicks (two tuples: [(6,4), (4,4)])
     game_over = False
-    move_log_font = p.font.SysFont("Arial", 14, False, False) # For move log
+    load_fonts()
+    view = BoardView(screen, FONTS["move_log"], FONTS["thinking"], FONTS["end_game"])
+    p.display.flip()
 
     while running:
+        human_turn = (gs.white_to_move and PLAYER_ONE) or (not gs.white_to_move and PLAYER_TWO)
         for e in p.event.get():
             if e.type == p.QUIT:
                 running = False
 
             # Mouse handling
-            elif e.type == p.MOUSEBUTTONDOWN:
-                if not game_over:
-                    location = p.mouse.get_pos()  # (x, y) location of mouse
+            elif e.type == p.MOUSEBUTTONDOWN and e.button == 1: # Wheel turns also arrive as buttons 4 and 5
+                location = e.pos  # (x, y) location of mouse
+                if not game_over and human_turn and pending_moves is None and location[0] < WIDTH:
                     col = location[0] // SQ_SIZE
                     row = location[1] // SQ_SIZE
 
@@ -73,66 +170,202 @@ def main():
                             player_clicks = [sq_selected]
                             print("Invalid move!") # For debugging, could show a message on screen
 
+            elif e.type == p.MOUSEWHEEL:
+                view.move_log.scroll(e.y)
+
             # Key handling
             elif e.type == p.KEYDOWN:
+                if e.key in (p.K_z, p.K_r): # Abandon any pending computation for the old position
+                    pending_search = cancel_pending(pending_search, searcher)
+                    pending_moves = cancel_pending(pending_moves, searcher)
                 if e.key == p.K_z:  # Undo move when 'z' is pressed
                     gs.undo_move()
+                    # Against the computer, take back to a human's turn, or it would just replay its move
+                    while gs.move_log and (PLAYER_ONE or PLAYER_TWO) and \
+                            not ((gs.white_to_move and PLAYER_ONE) or (not gs.white_to_move and PLAYER_TWO)):
+                        gs.undo_move()
                     move_made = True
                     game_over = False # Game is no longer over if you undo a checkmate/stalemate
                 if e.key == p.K_r: # Reset game when 'r' is pressed
-                    gs = chess_engine.GameState()
-                    valid_moves = gs.get_valid_moves()
+                    gs.load_fen(chess_engine.START_FEN) # Reuses the existing GameState
                     sq_selected = ()
                     player_clicks = []
-                    move_made = False
+                    move_made = True
                     game_over = False
 
-
         if move_made:
-            valid_moves = gs.get_valid_moves()
+            valid_moves = []
+            pending_moves = worker.submit(find_valid_moves, gs.get_snapshot())
             move_made = False
 
-        draw_game_state(screen, gs, valid_moves, sq_selected, move_log_font)
+        if pending_moves is not None and pending_moves.done():
+            valid_moves, gs.checkmate, gs.stalemate, gs.draw = pending_moves.result()
+            pending_moves = None
+
+        # Computer move
+        human_turn = (gs.white_to_move and PLAYER_ONE) or (not gs.white_to_move and PLAYER_TWO)
+        if not human_turn and pending_moves is None and pending_search is None and \
+                not (gs.checkmate or gs.stalemate or gs.draw):
+            searcher.stopped = False # The single worker has finished any search cancelled earlier
+            pending_search = worker.submit(find_computer_move, searcher, book, gs.get_snapshot())
+        if pending_search is not None and pending_search.done():
+            computer_move = pending_search.result()
+            pending_search = None
+            if computer_move is not None:
+                gs.make_move(computer_move)
+                valid_moves = []
+                pending_moves = worker.submit(find_valid_moves, gs.get_snapshot())
 
+        end_text = None
         if gs.checkmate:
             game_over = True
-            text = "Black wins by checkmate" if gs.white_to_move else "White wins by checkmate"
-            draw_end_game_text(screen, text)
+            end_text = "Black wins by checkmate" if gs.white_to_move else "White wins by checkmate"
         elif gs.stalemate:
             game_over = True
-            draw_end_game_text(screen, "Stalemate")
+            end_text = "Stalemate"
+        elif gs.draw:
+            game_over = True
+            if gs.is_threefold_repetition():
+                end_text = "Draw by repetition"
+            elif gs.is_fifty_move_draw():
+                end_text = "Draw by fifty-move rule"
+            else:
+                end_text = "Drawn endgame"
 
+        # Only the squares and overlays that changed since the last frame are redrawn and sent
+        # to the display
+        thinking = pending_search is not None or pending_moves is not None
+        dirty_rects = view.draw(gs, valid_moves, sq_selected, end_text, thinking)
+        if dirty_rects:
+            p.display.update(dirty_rects)
         clock.tick(MAX_FPS)
-        p.display.flip()
 
-def highlight_squares(screen, gs, valid_moves, sq_selected):
+    cancel_pending(pending_search, searcher)
+    worker.shutdown(wait=False, cancel_futures=True)
+    if book is not None:
+        book.close()
+
+def cancel_pending(future, searcher):
     """
-    Highlights the selected square and possible moves for that piece.
+    Abandons a background job: queued jobs never start and a running search stops at its next
+    node check. Always returns None so callers can clear their reference in one line.
     """
-    if sq_selected: # Only highlight if a square is selected
-        r, c = sq_selected
-        # Check if the selected piece belongs to the current player
-        if gs.board[r][c][0] == ('w' if gs.white_to_move else 'b'):
-            # Highlight selected square
+    if future is not None and not future.cancel():
+        searcher.stop()
+    return None
+
+def draw_thinking_indicator(screen, font):
+    """
+    Shows a small "Thinking..." label while background work is pending. Returns the area drawn.
+    """
+    text_obj = font.render("Thinking...", True, p.Color("red"))
+    return screen.blit(text_obj, (5, HEIGHT - text_obj.get_height() - 5))
+
+class BoardView:
+    """
+    Incremental board renderer. Remembers what was last drawn on every square and only
+    repaints the squares whose piece or highlight changed, from a pre-rendered background.
+    draw() returns the dirty rectangles to pass to p.display.update, so idle frames cost
+    64 comparisons and no blits.
+    """
+    def __init__(self, screen, move_log_font, thinking_font, end_game_font):
+        self.screen = screen
+        self.thinking_font = thinking_font
+        self.end_game_font = end_game_font
+        self.background = p.Surface((WIDTH, HEIGHT))
+        draw_board(self.background)
+        self.highlights = {}
+        for color in ('blue', 'green'):
             s = p.Surface((SQ_SIZE, SQ_SIZE))
             s.set_alpha(100) # Transparency value 0-255
-            s.fill(p.Color('blue'))
-            screen.blit(s, (c * SQ_SIZE, r * SQ_SIZE))
+            s.fill(p.Color(color))
+            self.highlights[color] = s
+        self.drawn = [None] * (DIMENSION * DIMENSION) # (piece, highlight) currently on each square
+        self.overlay = None # (end game text, thinking) currently on screen
+        self.overlay_rects = []
+        self.move_log = MoveLogPanel(p.Rect(WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT), move_log_font)
+        self.eval_font = move_log_font
+        self.eval_rect = p.Rect(WIDTH, MOVE_LOG_PANEL_HEIGHT, MOVE_LOG_PANEL_WIDTH, EVAL_PANEL_HEIGHT)
+        self.shown_eval = None # Evaluation currently on screen
 
-            # Highlight possible moves
-            s.fill(p.Color('green'))
-            for move in valid_moves:
-                if move.start_row == r and move.start_col == c:
-                    screen.blit(s, (move.end_col * SQ_SIZE, move.end_row * SQ_SIZE))
+    def draw(self, gs, valid_moves, sq_selected, end_text, thinking):
+        wanted = square_states(gs, valid_moves, sq_selected)
+        drawn = self.drawn
+        changed = [sq for sq in range(DIMENSION * DIMENSION) if wanted[sq] != drawn[sq]]
+        overlay = (end_text, thinking)
+        redraw_overlay = overlay != self.overlay or \
+            any(rect.collidelist([self._square_rect(sq) for sq in changed]) != -1 for rect in self.overlay_rects)
+        if redraw_overlay: # Text is blended onto the squares, so repaint everything under it first
+            for rect in self.overlay_rects:
+                self._forget(rect)
+            changed = [sq for sq in range(DIMENSION * DIMENSION) if wanted[sq] != drawn[sq]]
+        dirty = []
+        for sq in changed:
+            dirty.append(self._draw_square(sq, wanted[sq]))
+            drawn[sq] = wanted[sq]
+        if redraw_overlay:
+            self.overlay = overlay
+            self.overlay_rects = self._draw_overlay(end_text, thinking)
+            dirty.extend(self.overlay_rects)
+        self.move_log.sync(gs.move_log)
+        if self.move_log.dirty:
+            dirty.append(self.move_log.draw(self.screen))
+        score = gs.evaluate() # Maintained move by move, so reading it every frame is free
+        if score != self.shown_eval:
+            self.shown_eval = score
+            dirty.append(self._draw_eval(score))
+        return dirty
+
+    def _forget(self, rect):
+        for r in range(max(rect.top // SQ_SIZE, 0), min((rect.bottom - 1) // SQ_SIZE, DIMENSION - 1) + 1):
+            for c in range(max(rect.left // SQ_SIZE, 0), min((rect.right - 1) // SQ_SIZE, DIMENSION - 1) + 1):
+                self.drawn[r * DIMENSION + c] = None
 
-def draw_game_state(screen, gs, valid_moves, sq_selected, move_log_font):
+    @staticmethod
+    def _square_rect(sq):
+        return p.Rect((sq % DIMENSION) * SQ_SIZE, (sq // DIMENSION) * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+
+    def _draw_square(self, sq, state):
+        piece, highlight = state
+        rect = self._square_rect(sq)
+        self.screen.blit(self.background, rect, rect)
+        if highlight is not None:
+            self.screen.blit(self.highlights[highlight], rect)
+        if piece != "--":
+            self.screen.blit(IMAGES[piece], rect)
+        return rect
+
+    def _draw_eval(self, score):
+        p.draw.rect(self.screen, p.Color("#303030"), self.eval_rect)
+        text_obj = self.eval_font.render(f"Eval: {score / 100:+.2f}", True, p.Color("white"))
+        self.screen.blit(text_obj, self.eval_rect.move(MoveLogPanel.padding, (EVAL_PANEL_HEIGHT - text_obj.get_height()) // 2))
+        return self.eval_rect
+
+    def _draw_overlay(self, end_text, thinking):
+        rects = []
+        if end_text is not None:
+            rects.append(draw_end_game_text(self.screen, self.end_game_font, end_text))
+        if thinking:
+            rects.append(draw_thinking_indicator(self.screen, self.thinking_font))
+        return rects
+
+def square_states(gs, valid_moves, sq_selected):
     """
-    Draws the board, pieces, and potentially the move log.
+    (piece, highlight color or None) for every square, numbered row * 8 + col. The selected
+    square and the moves of the piece on it are highlighted.
     """
-    draw_board(screen)
-    highlight_squares(screen, gs, valid_moves, sq_selected)
-    draw_pieces(screen, gs.board)
-    draw_move_log(screen, gs, move_log_font) # New: Draw move log
+    board = gs.board
+    states = [(board[sq // DIMENSION][sq % DIMENSION], None) for sq in range(DIMENSION * DIMENSION)]
+    if sq_selected: # Only highlight if a square is selected
+        r, c = sq_selected
+        # Check if the selected piece belongs to the current player
+        if board[r][c][0] == ('w' if gs.white_to_move else 'b'):
+            for move in valid_moves:
+                if move.start_row == r and move.start_col == c:
+                    sq = move.end_row * DIMENSION + move.end_col
+                    states[sq] = (states[sq][0], 'green')
+            states[r * DIMENSION + c] = (board[r][c], 'blue')
+    return states
 
 def draw_board(screen):
     """
@@ -144,44 +377,112 @@ def draw_board(screen):
             color = colors[((r + c) % 2)]
             p.draw.rect(screen, color, p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE))
 
-def draw_pieces(screen, board):
+class MoveLogPanel:
     """
-    Draws the pieces on the board according to the current game state.
+    Scrollable move log beside the board. Keeps one rendered Surface per move pair, laid out
+    left to right and wrapped to the panel width. sync() only renders the pairs touched by
+    moves made or undone since the last frame, and draw() only blits the visible lines, so the
+    cost per frame does not grow with the length of the game.
     """
-    for r in range(DIMENSION):
-        for c in range(DIMENSION):
-            piece = board[r][c]
-            if piece != "--":
-                screen.blit(IMAGES[piece], p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    padding = 5
+    spacing = 10 # Horizontal gap between move pairs
 
-def draw_move_log(screen, gs, font):
-    """
-    Draws the move log on the screen.
-    """
-    move_log_rect = p.Rect(WIDTH, 0, 200, HEIGHT) # Assuming we extend WIDTH to make space
-    p.draw.rect(screen, p.Color("black"), move_log_rect)
-    move_log_string = ""
-    for i, move in enumerate(gs.move_log):
-        if i % 2 == 0:
-            move_log_string += str(i // 2 + 1) + ". " + move.get_chess_notation() + " "
-        else:
-            move_log_string += move.get_chess_notation() + "  "
+    def __init__(self, rect, font):
+        self.rect = rect
+        self.font = font
+        self.line_height = font.get_linesize()
+        self.text_width = rect.width - 2 * self.padding
+        self.text_height = rect.height - 2 * self.padding
+        self.moves = [] # The moves the cached surfaces were rendered from
+        self.entries = [] # (surface, x, y) for each move pair, relative to the top of the log
+        self.line_starts = [] # Index of the first move pair on each line
+        self.scroll_y = 0 # Pixels scrolled down from the top of the log
+        self.dirty = True
+
+    def sync(self, move_log):
+        """
+        Brings the cached pairs in line with move_log by popping the moves that were undone and
+        appending the ones that were made.
+        """
+        moves = self.moves
+        if len(moves) == len(move_log) and (not moves or moves[-1] is move_log[-1]):
+            return
+        following = self.scroll_y >= self._max_scroll() # Keep the latest move in view
+        while len(moves) > len(move_log) or (moves and moves[-1] is not move_log[len(moves) - 1]):
+            moves.pop()
+            if len(moves) % 2 == 1:
+                self._render_pair(len(moves) // 2) # Black's move was undone
+            else:
+                self._remove_last_pair()
+        while len(moves) < len(move_log):
+            moves.append(move_log[len(moves)])
+            self._render_pair((len(moves) - 1) // 2) # Black's move re-renders the pair white started
+        self.scroll_y = self._max_scroll() if following else min(self.scroll_y, self._max_scroll())
+        self.dirty = True
+
+    def scroll(self, lines):
+        """
+        Scrolls the log; positive values scroll up towards the first move, like the mouse wheel.
+        """
+        scroll_y = max(0, min(self.scroll_y - lines * self.line_height, self._max_scroll()))
+        if scroll_y != self.scroll_y:
+            self.scroll_y = scroll_y
+            self.dirty = True
 
-    # For simplicity, just render the whole string. For long games, this would need scrolling.
-    text_object = font.render(move_log_string, True, p.Color("white"))
-    screen.blit(text_object, p.Rect(WIDTH + 5, 5, 200, HEIGHT))
+    def draw(self, screen):
+        """
+        Draws the visible part of the log. Returns the area drawn.
+        """
+        p.draw.rect(screen, p.Color("black"), self.rect)
+        if self.line_starts:
+            first_line = self.scroll_y // self.line_height
+            last_line = (self.scroll_y + self.text_height - 1) // self.line_height + 1
+            start = self.line_starts[first_line]
+            end = self.line_starts[last_line] if last_line < len(self.line_starts) else len(self.entries)
+            screen.set_clip(self.rect.inflate(-2 * self.padding, -2 * self.padding))
+            left, top = self.rect.x + self.padding, self.rect.y + self.padding - self.scroll_y
+            for surface, x, y in self.entries[start:end]:
+                screen.blit(surface, (left + x, top + y))
+            screen.set_clip(None)
+        self.dirty = False
+        return self.rect
+
+    def _max_scroll(self):
+        return max(0, len(self.line_starts) * self.line_height - self.text_height)
+
+    def _render_pair(self, index):
+        # (Re)renders move pair `index`, which is always the last one
+        if len(self.entries) > index:
+            self._remove_last_pair()
+        text = str(index + 1) + ". " + self.moves[2 * index].get_chess_notation()
+        if len(self.moves) > 2 * index + 1:
+            text += " " + self.moves[2 * index + 1].get_chess_notation()
+        surface = self.font.render(text, True, p.Color("white"))
+        if not self.entries:
+            x, y = 0, 0
+            self.line_starts.append(index)
+        else:
+            previous, x, y = self.entries[-1]
+            x += previous.get_width() + self.spacing
+            if x + surface.get_width() > self.text_width: # Wrap onto a new line
+                x, y = 0, y + self.line_height
+                self.line_starts.append(index)
+        self.entries.append((surface, x, y))
 
+    def _remove_last_pair(self):
+        self.entries.pop()
+        if self.line_starts[-1] == len(self.entries):
+            self.line_starts.pop()
 
-def draw_end_game_text(screen, text):
+def draw_end_game_text(screen, font, text):
     """
-    Displays game over text in the center of the screen.
+    Displays game over text in the center of the screen. Returns the area drawn.
     """
-    font = p.font.SysFont("Helvetica", 32, True, False)
     text_obj = font.render(text, 0, p.Color("Gray")) # Use a darker color for visibility
     text_location = p.Rect(0, 0, WIDTH, HEIGHT).move(WIDTH / 2 - text_obj.get_width() / 2, HEIGHT / 2 - text_obj.get_height() / 2)
     screen.blit(text_obj, text_location)
     text_obj = font.render(text, 0, p.Color("Black")) # Outline effect
-    screen.blit(text_obj, text_location.move(2, 2))
+    return screen.blit(text_obj, text_location.move(2, 2)).union(text_location.clip(screen.get_rect()))
 
 
 if __name__ == "__main__":
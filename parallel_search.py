@@ -0,0 +1,161 @@
+"""
+Multi-process search.
+
+A single Python process can only search on one core, so ParallelSearcher splits the root
+moves across a process pool. Every worker runs its own iterative deepening search over its
+share of the root moves, and the best of the workers' answers is played. Positions travel to
+the workers as a compact GameState snapshot rather than a pickled GameState with its move log.
+
+    with ParallelSearcher(workers=8) as searcher:
+        result = searcher.search(gs, movetime=5.0)
+"""
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chess_engine
+import search
+
+_worker_searcher = None
+_worker_stop_event = None
+
+
+def _init_worker(stop_event):
+    global _worker_searcher, _worker_stop_event
+    _worker_searcher = search.Searcher()
+    _worker_stop_event = stop_event
+
+
+def _watch_stop_event(searcher, done):
+    while not done.is_set():
+        if _worker_stop_event.wait(0.05):
+            searcher.stop()
+            return
+
+
+def _search_root_moves(snapshot, root_move_codes, depth, movetime, nodes):
+    # Returns ([(depth, move code, score, pv notations) per completed iteration], nodes)
+    gs = chess_engine.GameState().load_snapshot(snapshot)
+    done = threading.Event()
+    _worker_searcher.stopped = False # Left set by the previous stop on this worker
+    watcher = threading.Thread(target=_watch_stop_event, args=(_worker_searcher, done), daemon=True)
+    watcher.start()
+    iterations = []
+
+    def record(result):
+        iterations.append((result.depth, result.best_move.code, result.score,
+                           [move.get_chess_notation() for move in result.pv]))
+    try:
+        result = _worker_searcher.search(gs, depth=depth, movetime=movetime, nodes=nodes,
+                                         on_iteration=record, root_move_codes=set(root_move_codes))
+    finally:
+        done.set()
+    if result.best_move is None:
+        return None
+    if not iterations: # Stopped before the first iteration finished
+        iterations.append((0, result.best_move.code, result.score, [result.best_move.get_chess_notation()]))
+    return iterations, result.nodes
+
+
+class ParallelSearcher:
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._stop_event = multiprocessing.Event()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self._stop_event,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+    def stop(self):
+        # Ask every worker to return its last completed iteration
+        self._stop_event.set()
+
+    def search(self, gs, depth=None, movetime=None, nodes=None):
+        """
+        Searches gs across the pool; same limits and result type as search.Searcher.search.
+        The node budget is split evenly between the workers.
+        """
+        start = time.perf_counter()
+        root_moves = gs.get_valid_moves()
+        if not root_moves:
+            return search.SearchResult(None, -search.MATE_SCORE if gs.checkmate else 0, 0, 0, [], 0.0)
+        if len(root_moves) == 1:
+            return search.SearchResult(root_moves[0], 0, 0, 0, [root_moves[0]], 0.0)
+
+        # Deal the root moves out round-robin so each worker gets a mix of good and bad ones
+        shares = [[] for _ in range(min(self.workers, len(root_moves)))]
+        ordered = sorted(root_moves, key=lambda move: move.piece_captured != "--", reverse=True)
+        for i, move in enumerate(ordered):
+            shares[i % len(shares)].append(move.code)
+        worker_nodes = nodes // len(shares) if nodes is not None else None
+
+        self._stop_event.clear()
+        snapshot = gs.get_snapshot()
+        futures = [self._executor.submit(_search_root_moves, snapshot, share, depth, movetime, worker_nodes)
+                   for share in shares]
+        answers = [answer for answer in (future.result() for future in futures) if answer is not None]
+
+        # Under time or node limits the workers reach different depths, and scores from
+        # different depths don't compare. Pick the worker whose best move scored highest at the
+        # deepest depth every worker completed, then play its deepest answer
+        common_depth = min(answer[0][-1][0] for answer in answers)
+        best_iterations = max((answer[0] for answer in answers),
+                              key=lambda iterations: next(score for d, _, score, _ in iterations if d == common_depth))
+        depth_reached, code, score, notations = best_iterations[-1]
+        best_move = next(move for move in root_moves if move.code == code)
+        pv = self._replay_pv(gs, notations)
+        return search.SearchResult(best_move, score, depth_reached, sum(answer[1] for answer in answers),
+                                   pv or [best_move], time.perf_counter() - start)
+
+    @staticmethod
+    def _replay_pv(gs, notations):
+        pv = []
+        for notation in notations:
+            move = next((m for m in gs.get_valid_moves() if m.get_chess_notation() == notation), None)
+            if move is None:
+                break
+            pv.append(move)
+            gs.make_move(move)
+        for _ in pv:
+            gs.undo_move()
+        gs.get_valid_moves()
+        return pv
+
+
+def parallel_find_best_move(gs, workers=None, depth=None, movetime=None, nodes=None):
+    """
+    Convenience wrapper: searches the position with a short-lived process pool.
+    """
+    with ParallelSearcher(workers) as searcher:
+        return searcher.search(gs, depth=depth, movetime=movetime, nodes=nodes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search a position on all cores.")
+    parser.add_argument("--fen", default=chess_engine.START_FEN)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--depth", type=int, default=None)
+    parser.add_argument("--movetime", type=float, default=None, help="seconds")
+    parser.add_argument("--nodes", type=int, default=None)
+    args = parser.parse_args(argv)
+    if args.depth is None and args.movetime is None and args.nodes is None:
+        args.movetime = 5.0
+    gs = chess_engine.GameState.from_fen(args.fen)
+    result = parallel_find_best_move(gs, args.workers, args.depth, args.movetime, args.nodes)
+    print(f"bestmove {result.best_move.get_chess_notation() if result.best_move else '(none)'}  "
+          f"score {result.score}  depth {result.depth}  nodes {result.nodes}  {result.seconds:.2f}s  "
+          f"pv {' '.join(move.get_chess_notation() for move in result.pv)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Perft (performance test) for the move generator.
+
+Counts the leaf nodes of the legal move tree to a given depth using only make_move,
+undo_move and get_valid_move_codes, so it checks the generator's correctness against known node
+counts and measures its speed. Runs headless, without pygame.
+
+    python perft.py                      # run the bundled suite
+    python perft.py --depth 4 --divide   # per-move breakdown from the starting position
+    python perft.py --fen "<fen>" --depth 3 --backend bitboard --json results.json
+    python perft.py --depth 3 --stats    # where the generator spends its time
+"""
+import argparse
+import json
+import sys
+import time
+
+import chess_engine
+
+START_FEN = chess_engine.START_FEN
+
+# (name, fen, {depth: nodes}) - well known positions covering castling, en passant, promotions and pins
+SUITE = [
+    ("start", START_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("endgame-en-passant", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("promotions", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("promotions-mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("discovered-promotion", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+]
+
+
+def make_game_state(backend="list"):
+    if backend == "bitboard":
+        import bitboard_engine
+        return bitboard_engine.BitboardGameState()
+    return chess_engine.GameState()
+
+
+def perft(gs, depth):
+    """
+    Counts the leaf nodes of the legal move tree below the current position.
+    """
+    moves = gs.get_valid_move_codes()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += perft(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+
+def divide(gs, depth):
+    """
+    Returns {move notation: leaf nodes} for every root move.
+    """
+    counts = {}
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        counts[move.get_chess_notation()] = perft(gs, depth - 1)
+        gs.undo_move()
+    return counts
+
+
+def run(fen, depth, backend="list", show_divide=False, expected=None, name=None):
+    gs = make_game_state(backend).load_fen(fen)
+    start = time.perf_counter()
+    if show_divide:
+        counts = divide(gs, depth)
+        nodes = sum(counts.values())
+    else:
+        counts = None
+        nodes = perft(gs, depth)
+    seconds = time.perf_counter() - start
+    result = {
+        "name": name or fen,
+        "fen": fen,
+        "backend": backend,
+        "depth": depth,
+        "nodes": nodes,
+        "seconds": round(seconds, 4),
+        "nps": int(nodes / seconds) if seconds > 0 else 0,
+        "expected": expected,
+        "ok": expected is None or nodes == expected,
+    }
+    if counts is not None:
+        for notation in sorted(counts):
+            print(f"  {notation}: {counts[notation]}")
+        result["divide"] = counts
+    status = "" if expected is None else ("  ok" if result["ok"] else f"  FAIL (expected {expected})")
+    print(f"{result['name']:<22} depth {depth}  nodes {nodes:>9}  {seconds:8.3f}s  {result['nps']:>8} nps{status}")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count move generator leaf nodes (perft).")
+    parser.add_argument("--fen", help="position to test (default: run the bundled suite)")
+    parser.add_argument("--depth", type=int, default=3,
+                        help="search depth; with the suite this is the maximum depth per position")
+    parser.add_argument("--divide", action="store_true", help="print node counts per root move")
+    parser.add_argument("--backend", choices=("list", "bitboard"), default="list")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON to PATH")
+    parser.add_argument("--stats", action="store_true", help="print engine call counts and timings")
+    args = parser.parse_args(argv)
+
+    if args.stats:
+        import bitboard_engine
+        import instrumentation
+        stats = instrumentation.enable((chess_engine.GameState, bitboard_engine.BitboardGameState))
+
+    results = []
+    if args.fen:
+        results.append(run(args.fen, args.depth, args.backend, args.divide))
+    else:
+        for name, fen, counts in SUITE:
+            depth = min(args.depth, max(counts))
+            results.append(run(fen, depth, args.backend, args.divide, counts[depth], name))
+
+    if args.stats:
+        instrumentation.disable()
+        print(stats.report())
+
+    total_nodes = sum(r["nodes"] for r in results)
+    total_seconds = sum(r["seconds"] for r in results)
+    print(f"total nodes {total_nodes}  {total_seconds:.3f}s  "
+          f"{int(total_nodes / total_seconds) if total_seconds > 0 else 0} nps")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"backend": args.backend, "results": results,
+                       "total_nodes": total_nodes, "total_seconds": round(total_seconds, 4)}, f, indent=2)
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+"""
+PGN support for the chess_engine rules.
+
+Standard Algebraic Notation for GameState moves, formatting of finished games as PGN text, and
+a streaming reader that replays PGN archives through the rules engine. The reader memory-maps
+the file and parses one game at a time, so memory use does not depend on the archive size;
+validate_file can split an archive by game offset across a process pool.
+
+    san = pgn.move_to_san(gs, move)
+    text = pgn.format_game({"White": "me", "Black": "you"}, ["e4", "e5"], "*")
+    for game, ply, gs in pgn.iter_positions("games.pgn"):
+        ...
+    python pgn.py games.pgn --workers 8
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chess_engine
+
+# The Seven Tag Roster, written first and in this order
+ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+
+def move_to_san(gs, move, valid_moves=None):
+    """
+    SAN for a legal move in the current position, e.g. "Nbd7", "exd6", "e8=Q+", "O-O#".
+    valid_moves (the position's get_valid_moves) is only used to disambiguate and is
+    generated when not given.
+    """
+    if move.is_castle_move:
+        san = "O-O" if move.end_col == 6 else "O-O-O"
+    else:
+        piece = move.piece_moved[1]
+        destination = move.get_rank_file(move.end_row, move.end_col)
+        capture = move.piece_captured != "--"
+        if piece == 'P':
+            san = (move.cols_to_files[move.start_col] + "x" if capture else "") + destination
+            if move.is_pawn_promotion:
+                san += "=" + move.promotion_choice
+        else:
+            if valid_moves is None:
+                valid_moves = gs.get_valid_moves()
+            san = piece + _disambiguation(move, valid_moves) + ("x" if capture else "") + destination
+    gs.make_move(move)
+    if gs.in_check():
+        san += "#" if not gs.get_valid_move_codes() else "+"
+    gs.undo_move()
+    return san
+
+
+def _disambiguation(move, valid_moves):
+    # Start file, rank or square needed to tell move apart from same-piece moves to its square
+    rivals = [other for other in valid_moves
+              if other.piece_moved == move.piece_moved and other.end_row == move.end_row and
+              other.end_col == move.end_col and
+              (other.start_row, other.start_col) != (move.start_row, move.start_col)]
+    if not rivals:
+        return ""
+    if all(other.start_col != move.start_col for other in rivals):
+        return move.cols_to_files[move.start_col]
+    if all(other.start_row != move.start_row for other in rivals):
+        return move.get_rank_file(move.start_row, move.start_col)[1]
+    return move.get_rank_file(move.start_row, move.start_col)
+
+
+def format_game(headers, sans, result, start_ply=0):
+    """
+    PGN text for one game: tag pairs, then the numbered movetext wrapped at 80 columns.
+    start_ply is the number of plies played before the first move, odd when black moves first.
+    """
+    lines = []
+    for name in ROSTER:
+        lines.append(f'[{name} "{_escape(headers.get(name, result if name == "Result" else "?"))}"]')
+    for name, value in headers.items():
+        if name not in ROSTER:
+            lines.append(f'[{name} "{_escape(value)}"]')
+    lines.append("")
+
+    tokens = []
+    for i, san in enumerate(sans):
+        ply = start_ply + i
+        if ply % 2 == 0:
+            tokens.append(f"{ply // 2 + 1}.")
+        elif i == 0:
+            tokens.append(f"{ply // 2 + 1}...")
+        tokens.append(san)
+    tokens.append(result)
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+class PgnError(ValueError):
+    pass
+
+
+class PgnGame:
+    def __init__(self, headers, sans, result, offset):
+        self.headers = headers
+        self.sans = sans
+        self.result = result
+        self.offset = offset # Byte offset of the game in its file
+
+
+# Tag values are read up to the last quote on the line, as some writers leave quotes unescaped
+TAG_RE = re.compile(r'\s*\[\s*(\w+)\s+"(.*)"\s*\]\s*$')
+_TAG_LINE_RE = re.compile(TAG_RE.pattern.encode()) # For the memory-mapped bytes
+# Comments, variations, NAGs and move numbers are skipped; what is left is SAN and the result
+MOVETEXT_RE = re.compile(r'\{[^}]*\}|;[^\n]*|\(|\)|\$\d+|\d+\.+|(1-0|0-1|1/2-1/2|\*)|([^\s(){};$.]+)')
+SAN_RE = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+
+
+def read_games(path, start=0, end=None):
+    """
+    Yields a PgnGame for every game in the file that starts at a byte offset in [start, end).
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for game_start, game_end in _game_spans(mm, start, size if end is None else end):
+            yield _parse_game(mm[game_start:game_end].decode("utf-8", "replace"), game_start)
+
+
+def _game_spans(mm, start, end):
+    # A game starts at a tag line whose previous non-blank line is not a tag line. Lines that
+    # begin inside a {...} comment are never tags, as comments may wrap onto "[%clk ...]" lines
+    size = len(mm)
+    pos = start
+    if pos > 0 and mm[pos - 1] != ord("\n"): # Start on the next full line
+        pos = mm.find(b"\n", pos)
+        pos = size if pos == -1 else pos + 1
+    previous_is_tag = _previous_line_is_tag(mm, pos)
+    in_comment = _inside_comment(mm, pos)
+    game_start = None
+    while pos < size:
+        line_end = mm.find(b"\n", pos)
+        line_end = size if line_end == -1 else line_end + 1
+        line = mm[pos:line_end].strip()
+        if line:
+            is_tag = not in_comment and _TAG_LINE_RE.match(line) is not None
+            if is_tag and not previous_is_tag:
+                if game_start is not None:
+                    yield game_start, pos
+                    game_start = None
+                if pos >= end:
+                    return
+                game_start = pos
+            if not is_tag: # Braces in tag values don't open comments
+                in_comment = _comment_open_after(line, in_comment)
+            previous_is_tag = is_tag
+        pos = line_end
+    if game_start is not None:
+        yield game_start, size
+
+
+def _previous_line_is_tag(mm, pos):
+    line_end = pos
+    while line_end > 0:
+        line_start = mm.rfind(b"\n", 0, line_end - 1) + 1
+        line = mm[line_start:line_end].strip()
+        if line:
+            return _TAG_LINE_RE.match(line) is not None and not _inside_comment(mm, line_start)
+        line_end = line_start
+    return False
+
+
+def _inside_comment(mm, pos):
+    # Comments don't nest, so pos is inside one when the last brace before it opens one
+    return mm.rfind(b"{", 0, pos) > mm.rfind(b"}", 0, pos)
+
+
+def _comment_open_after(line, in_comment):
+    # Follows the {...} comments (and ; rest-of-line comments) through one line of movetext
+    i = 0
+    while True:
+        if in_comment:
+            i = line.find(b"}", i)
+            if i == -1:
+                return True
+            in_comment = False
+        else:
+            brace, semicolon = line.find(b"{", i), line.find(b";", i)
+            if brace == -1 or -1 < semicolon < brace:
+                return False
+            i, in_comment = brace, True
+        i += 1
+
+
+def _parse_game(text, offset):
+    headers = {}
+    body_start = 0
+    for line in text.splitlines(True):
+        if line.strip():
+            match = TAG_RE.match(line)
+            if match is None:
+                break # Movetext has begun
+            headers[match.group(1)] = re.sub(r'\\(["\\])', r'\1', match.group(2))
+        body_start += len(line)
+    sans = []
+    result = headers.get("Result", "*")
+    depth = 0 # Nesting level of variations, whose moves are skipped
+    for match in MOVETEXT_RE.finditer(text, body_start):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            if match.group(1):
+                result = match.group(1)
+            elif match.group(2):
+                sans.append(match.group(2))
+    return PgnGame(headers, sans, result, offset)
+
+
+def san_to_move(san, valid_moves):
+    """
+    The Move in valid_moves (a position's get_valid_moves) that the SAN string describes.
+    """
+    token = san.rstrip("+#!?")
+    if token in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        end_col = 6 if len(token) == 3 else 2
+        matches = [move for move in valid_moves if move.is_castle_move and move.end_col == end_col]
+    else:
+        match = SAN_RE.match(token)
+        if match is None:
+            raise PgnError(f"cannot parse move {san!r}")
+        piece, file, rank, square, promotion = match.groups()
+        piece = piece or 'P'
+        end_row = chess_engine.Move.ranks_to_rows[square[1]]
+        end_col = chess_engine.Move.files_to_cols[square[0]]
+        matches = [move for move in valid_moves
+                   if move.piece_moved[1] == piece and move.end_row == end_row and move.end_col == end_col and
+                   (file is None or move.start_col == chess_engine.Move.files_to_cols[file]) and
+                   (rank is None or move.start_row == chess_engine.Move.ranks_to_rows[rank]) and
+                   move.promotion_choice == promotion and not move.is_castle_move]
+    if len(matches) != 1:
+        raise PgnError(f"{'ambiguous' if matches else 'illegal'} move {san!r}")
+    return matches[0]
+
+
+def replay(game, gs=None):
+    """
+    Plays a game through the rules engine, yielding (move, gs) after every move. The same
+    GameState is updated in place, so copy anything needed before advancing the generator.
+    Raises PgnError at the first move that is not legal.
+    """
+    gs = gs or chess_engine.GameState()
+    if "FEN" in game.headers:
+        try:
+            gs.load_fen(game.headers["FEN"])
+        except (ValueError, KeyError, IndexError):
+            raise PgnError(f"game at offset {game.offset}: bad FEN {game.headers['FEN']!r}") from None
+    else: # A reused GameState may hold the previous game
+        gs.load_fen(chess_engine.START_FEN)
+    for ply, san in enumerate(game.sans, 1):
+        try:
+            move = san_to_move(san, gs.get_valid_moves())
+        except PgnError as e:
+            raise PgnError(f"game at offset {game.offset}, ply {ply}: {e}") from None
+        gs.make_move(move)
+        yield move, gs
+
+
+def iter_positions(path, start=0, end=None):
+    """
+    Lazily yields (game, ply, gs) for every position reached in the file. gs is reused from
+    move to move; games with an illegal move stop at the last legal position.
+    """
+    for game in read_games(path, start, end):
+        ply = 0
+        try:
+            for _, gs in replay(game):
+                ply += 1
+                yield game, ply, gs
+        except PgnError:
+            continue
+
+
+def _validate_shard(path, start, end, max_errors):
+    games = positions = 0
+    errors = []
+    for game in read_games(path, start, end):
+        games += 1
+        try:
+            for _ in replay(game):
+                positions += 1
+        except PgnError as e:
+            if len(errors) < max_errors:
+                errors.append(str(e))
+            else:
+                errors.append(None) # Counted but not kept
+    return games, positions, errors
+
+
+def validate_file(path, workers=1, max_errors=100):
+    """
+    Replays every game in the file and returns {"games", "positions", "illegal_games", "errors"}.
+    With several workers the file is cut into byte ranges and each worker replays the games that
+    start in its ranges, memory-mapping the file itself.
+    """
+    if workers > 1:
+        size = os.path.getsize(path)
+        shards = workers * 4 # Several shards per worker evens out uneven game lengths
+        bounds = [size * i // shards for i in range(shards + 1)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(_validate_shard, [path] * shards, bounds[:-1], bounds[1:],
+                                      [max_errors] * shards))
+    else:
+        parts = [_validate_shard(path, 0, None, max_errors)]
+    errors = [error for part in parts for error in part[2]]
+    return {
+        "games": sum(part[0] for part in parts),
+        "positions": sum(part[1] for part in parts),
+        "illegal_games": len(errors),
+        "errors": [error for error in errors if error is not None][:max_errors],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay PGN files through the rules engine.")
+    parser.add_argument("paths", nargs="+", metavar="PATH")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+    failed = False
+    for path in args.paths:
+        start = time.perf_counter()
+        stats = validate_file(path, args.workers)
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        failed = failed or stats["illegal_games"] > 0
+        if args.json:
+            print(json.dumps({"path": path, **stats}))
+            continue
+        print(f"{path}: games {stats['games']}  positions {stats['positions']}  "
+              f"illegal {stats['illegal_games']}  {stats['seconds']:.2f}s")
+        for error in stats["errors"]:
+            print(f"  {error}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,416 @@
+"""
+Move search on top of the chess_engine rules.
+
+Negamax alpha-beta with iterative deepening, quiescence search over captures, a staged move
+picker (hash move, captures by static exchange evaluation, promotions, killers, then quiets
+by history), and a fixed-size transposition table keyed by the GameState Zobrist key. Works
+with any backend that provides the GameState API.
+
+    result = search.find_best_move(gs, movetime=1.0)
+    gs.make_move(result.best_move)
+"""
+import time
+
+import bitbases
+from chess_engine import EN_PASSANT_FLAG, PROMOTION_FLAG, GameState, Move
+
+MATE_SCORE = 100000
+MAX_PLY = 64
+KNOWN_WIN = MATE_SCORE // 2 # Bitbase wins score above any material balance but below mates
+BITBASE_PIECES = 5 # Probe the bitbases when the root has at most this many pieces, kings included
+PIECE_VALUES = {'P': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0}
+# Static exchange values: the king is worth more than anything it could win, so it only
+# ends an exchange by capturing last
+SEE_VALUES = dict(PIECE_VALUES, K=20000)
+
+# Transposition table entry bounds
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+
+class SearchResult:
+    def __init__(self, best_move, score, depth, nodes, pv, seconds):
+        self.best_move = best_move
+        self.score = score # Centipawns from the side to move's point of view
+        self.depth = depth # Deepest fully completed iteration
+        self.nodes = nodes
+        self.pv = pv # Principal variation, a list of Moves starting with best_move
+        self.seconds = seconds
+
+
+class TranspositionTable:
+    """
+    Fixed-size table of (key, depth, score, bound, move code, generation) entries indexed by the
+    low bits of the Zobrist key. An entry is replaced when it comes from an older search or
+    when the new result is searched at least as deep.
+    """
+    def __init__(self, size_bits=18):
+        self.mask = (1 << size_bits) - 1
+        self.entries = [None] * (1 << size_bits)
+        self.generation = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def probe(self, key):
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None or entry[5] != self.generation or depth >= entry[1] or entry[0] == key:
+            self.entries[index] = (key, depth, score, bound, move, self.generation)
+
+    def clear(self):
+        self.entries = [None] * (self.mask + 1)
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def evaluate(gs):
+    """
+    Static evaluation in centipawns from the point of view of the side to move: the material
+    and piece-square score GameState maintains incrementally, so this is O(1).
+    """
+    score = gs.evaluate()
+    return score if gs.white_to_move else -score
+
+
+def static_exchange(gs, code):
+    """
+    Static exchange evaluation of a capture: the material the side to move comes out with
+    when both sides keep recapturing on the target square with their least valuable piece,
+    and either may stop when carrying on would lose. Pins are not taken into account.
+    """
+    board = gs.board
+    start, end = code & 63, (code >> 6) & 63
+    target_row, target_col = end >> 3, end & 7
+    attacker = board[start >> 3][start & 7]
+    removed = {start} # Squares whose pieces have already captured, so sliders see through them
+    if code & EN_PASSANT_FLAG:
+        gain = [SEE_VALUES['P']]
+        removed.add((start & 56) | target_col)
+    else:
+        gain = [SEE_VALUES[board[target_row][target_col][1]]]
+    value = SEE_VALUES[attacker[1]]
+    if code & PROMOTION_FLAG:
+        value = SEE_VALUES[Move.promotion_pieces[(code >> 12) & 3]]
+        gain[0] += value - SEE_VALUES['P']
+    color = 'b' if attacker[0] == 'w' else 'w'
+    while True:
+        gain.append(value - gain[-1]) # Score if the piece that just captured is taken in turn
+        sq = _least_valuable_attacker(board, target_row, target_col, color, removed)
+        if sq is None:
+            break
+        removed.add(sq)
+        value = SEE_VALUES[board[sq >> 3][sq & 7][1]]
+        color = 'b' if color == 'w' else 'w'
+    gain.pop() # The last recapture never happened
+    for i in range(len(gain) - 1, 0, -1):
+        gain[i - 1] = -max(-gain[i - 1], gain[i])
+    return gain[0]
+
+
+def _least_valuable_attacker(board, r, c, color, removed):
+    # Square (row * 8 + col) of color's cheapest piece attacking (r, c), ignoring the pieces
+    # on the removed squares; None when there is none
+    pawn_row = r + 1 if color == 'w' else r - 1
+    if 0 <= pawn_row < 8:
+        for end_col in (c - 1, c + 1):
+            if 0 <= end_col < 8 and board[pawn_row][end_col] == color + 'P' and pawn_row * 8 + end_col not in removed:
+                return pawn_row * 8 + end_col
+    for d_row, d_col in GameState.knight_offsets:
+        end_row, end_col = r + d_row, c + d_col
+        if 0 <= end_row < 8 and 0 <= end_col < 8 and board[end_row][end_col] == color + 'N' and \
+                end_row * 8 + end_col not in removed:
+            return end_row * 8 + end_col
+    best, best_value = None, None
+    for j, (d_row, d_col) in enumerate(GameState.king_directions):
+        sliders = 'RQ' if j < 4 else 'BQ'
+        for i in range(1, 8):
+            end_row, end_col = r + d_row * i, c + d_col * i
+            if not (0 <= end_row < 8 and 0 <= end_col < 8):
+                break
+            sq = end_row * 8 + end_col
+            piece = board[end_row][end_col]
+            if piece == "--" or sq in removed:
+                continue
+            if piece[0] == color and (piece[1] in sliders or (i == 1 and piece[1] == 'K')) and \
+                    (best is None or SEE_VALUES[piece[1]] < best_value):
+                best, best_value = sq, SEE_VALUES[piece[1]]
+            break
+    return best
+
+
+class Searcher:
+    def __init__(self, tt_size_bits=18):
+        self.tt = TranspositionTable(tt_size_bits)
+        # Set from another thread to abandon the search. search() leaves it alone, so a stop that
+        # arrives before the search starts still counts; callers clear it when starting a job
+        self.stopped = False
+        self.nodes = 0
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {}
+        self._deadline = None
+        self._node_limit = None
+        self._root_move_codes = None
+        self._probe_bitbases = False
+        self._root_in_bitbase = False
+
+    def stop(self):
+        self.stopped = True
+
+    def search(self, gs, depth=None, movetime=None, nodes=None, on_iteration=None, root_move_codes=None):
+        """
+        Iterative deepening search. Stops after `depth` plies, `movetime` seconds or `nodes`
+        nodes, whichever comes first, and returns the result of the last completed iteration.
+        on_iteration(result) is called after every completed depth. root_move_codes restricts
+        the search to those root moves (packed move codes).
+        """
+        start = time.perf_counter()
+        max_depth = min(depth or MAX_PLY - 1, MAX_PLY - 1)
+        self._deadline = start + movetime if movetime is not None else None
+        self._node_limit = nodes
+        self.nodes = 0
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {}
+        self.tt.new_search()
+        self._probe_bitbases = sum(piece != "--" for row in gs.board for piece in row) <= BITBASE_PIECES
+        self._root_in_bitbase = self._probe_bitbases and bitbases.probe(gs) is not None
+
+        root_moves = gs.get_valid_move_codes()
+        self._root_move_codes = root_move_codes
+        if root_move_codes is not None:
+            root_moves = [code for code in root_moves if code in root_move_codes]
+        if not root_moves:
+            return SearchResult(None, -MATE_SCORE if gs.checkmate else 0, 0, 0, [], 0.0)
+        first_move = gs.move_from_code(root_moves[0])
+        result = SearchResult(first_move, 0, 0, 0, [first_move], 0.0)
+        root_length = len(gs.move_log)
+        for current_depth in range(1, max_depth + 1):
+            try:
+                score = self._negamax(gs, current_depth, 0, -MATE_SCORE - 1, MATE_SCORE + 1)
+            except SearchTimeout:
+                while len(gs.move_log) > root_length: # Unwind the moves made below the root
+                    gs.undo_move()
+                break
+            pv = self._principal_variation(gs, current_depth)
+            if pv:
+                result = SearchResult(pv[0], score, current_depth, self.nodes, pv, time.perf_counter() - start)
+            if on_iteration is not None:
+                on_iteration(result)
+            # Forced mate found, or only one move: searching deeper won't change the answer. A
+            # search over a share of the root moves keeps going, as its caller compares the
+            # shares at a depth they all reached
+            if root_move_codes is None and (abs(score) >= MATE_SCORE - MAX_PLY or len(root_moves) == 1):
+                break
+        result.nodes = self.nodes
+        result.seconds = time.perf_counter() - start
+        gs.get_valid_move_codes() # Leave the checkmate/stalemate flags describing the root position
+        return result
+
+    def _check_limits(self):
+        if self.stopped or (self._node_limit is not None and self.nodes >= self._node_limit) or \
+                (self._deadline is not None and time.perf_counter() >= self._deadline):
+            raise SearchTimeout()
+
+    def _negamax(self, gs, depth, ply, alpha, beta):
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self._check_limits()
+        if ply > 0 and (gs.halfmove_clock >= 100 or gs.repetition_counts[gs.zobrist_key] > 1):
+            return 0
+        if self._probe_bitbases and ply > 0:
+            # Lines that reach a table end there. When the root is already in a table, only
+            # draws and the leaves are scored from it, so the search can still find the mate
+            result = bitbases.probe(gs)
+            if result is not None and (result == 0 or depth <= 0 or not self._root_in_bitbase):
+                return self._bitbase_score(gs, result, ply)
+        if depth <= 0:
+            return self._quiescence(gs, ply, alpha, beta)
+
+        original_alpha = alpha
+        entry = self.tt.probe(gs.zobrist_key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            if ply > 0 and entry[1] >= depth:
+                score, bound = entry[2], entry[3]
+                if bound == EXACT or (bound == LOWER_BOUND and score >= beta) or \
+                        (bound == UPPER_BOUND and score <= alpha):
+                    return score
+
+        best_score = -MATE_SCORE - 1
+        best_move = None
+        for move in self._pick_moves(gs, tt_move, ply):
+            gs.make_move(move)
+            score = -self._negamax(gs, depth - 1, ply + 1, -beta, -alpha)
+            gs.undo_move()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not self._is_tactical(gs, move):
+                            self._record_cutoff(gs, move, depth, ply)
+                        break
+        if best_move is None: # No legal moves
+            return -MATE_SCORE + ply if gs.in_check() else 0
+
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.tt.store(gs.zobrist_key, depth, best_score, bound, best_move)
+        return best_score
+
+    def _quiescence(self, gs, ply, alpha, beta):
+        stand_pat = evaluate(gs)
+        if stand_pat >= beta or ply >= MAX_PLY - 1:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        moves = gs.get_valid_move_codes()
+        if not moves:
+            return -MATE_SCORE + ply if gs.checkmate else 0
+        captures = []
+        for code in moves:
+            if self._is_tactical(gs, code):
+                gain = static_exchange(gs, code) if gs.piece_on((code >> 6) & 63) != "--" else self._mvv_lva(gs, code)
+                if gain >= 0: # Captures that lose material can't raise alpha above the stand pat
+                    captures.append((gain, code))
+        captures.sort(reverse=True)
+        for _, move in captures:
+            self.nodes += 1
+            if self.nodes & 1023 == 0:
+                self._check_limits()
+            gs.make_move(move)
+            score = -self._quiescence(gs, ply + 1, -beta, -alpha)
+            gs.undo_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    @staticmethod
+    def _bitbase_score(gs, result, ply):
+        # Exact win/draw from the bitbases. Wins are graded so the search still makes progress:
+        # drive the losing king to the edge, bring the winning king closer and push the pawn
+        if result == 0:
+            return 0
+        if result < 0 and not gs.get_valid_move_codes():
+            return -MATE_SCORE + ply
+        winner = 'w' if gs.white_to_move == (result > 0) else 'b'
+        (white_row, white_col), (black_row, black_col) = gs.white_king_location, gs.black_king_location
+        loser_row, loser_col = (black_row, black_col) if winner == 'w' else (white_row, white_col)
+        score = KNOWN_WIN - ply
+        score += 20 * (abs(2 * loser_row - 7) + abs(2 * loser_col - 7)) # Away from the centre
+        score -= 10 * (abs(white_row - black_row) + abs(white_col - black_col))
+        for r, row in enumerate(gs.board):
+            for c, piece in enumerate(row):
+                if piece[0] == winner and piece[1] != 'K':
+                    score += PIECE_VALUES[piece[1]]
+                    if piece[1] == 'P':
+                        score += 20 * (6 - r if winner == 'w' else r - 1)
+        return score if result > 0 else -score
+
+    @staticmethod
+    def _is_tactical(gs, code):
+        # Captures (including en passant) and promotions
+        return code & (PROMOTION_FLAG | EN_PASSANT_FLAG) or gs.piece_on((code >> 6) & 63) != "--"
+
+    @staticmethod
+    def _mvv_lva(gs, code):
+        # Most valuable victim first, then least valuable attacker
+        victim = 'P' if code & EN_PASSANT_FLAG else gs.piece_on((code >> 6) & 63)[1]
+        score = 10 * PIECE_VALUES[victim] - PIECE_VALUES[gs.piece_on(code & 63)[1]] if victim != '-' else 0
+        if code & PROMOTION_FLAG:
+            score += PIECE_VALUES[Move.promotion_pieces[(code >> 12) & 3]]
+        return score
+
+    def _pick_moves(self, gs, tt_move, ply):
+        """
+        Staged move picker. Yields the hash move before any moves are generated, then the
+        captures ordered by static exchange evaluation, promotions, the killers and finally
+        the remaining quiet moves by history. Each stage is only prepared once the previous
+        one is exhausted, so a cutoff on the hash move costs no move generation at all and a
+        cutoff on a capture never scores or sorts the quiet moves.
+        """
+        root_moves = self._root_move_codes if ply == 0 else None
+        # A hash move from an entry with the same 64-bit key is legal here; checking the mover's
+        # colour guards make_move against a key collision
+        if tt_move is not None and (root_moves is None or tt_move in root_moves) and \
+                gs.piece_on(tt_move & 63)[0] == ('w' if gs.white_to_move else 'b'):
+            yield tt_move
+        else:
+            tt_move = None
+
+        moves = gs.get_valid_move_codes()
+        captures, promotions, quiets = [], [], []
+        for code in moves:
+            if code == tt_move or (root_moves is not None and code not in root_moves):
+                continue
+            if code & EN_PASSANT_FLAG or gs.piece_on((code >> 6) & 63) != "--":
+                captures.append(code)
+            elif code & PROMOTION_FLAG:
+                promotions.append(code)
+            else:
+                quiets.append(code)
+
+        if captures:
+            scored = [(static_exchange(gs, code), self._mvv_lva(gs, code), code) for code in captures]
+            scored.sort(reverse=True)
+            for _, _, code in scored:
+                yield code
+        yield from promotions # Generated queen first
+
+        if not quiets:
+            return
+        killers = [killer for killer in self.killers[ply] if killer is not None and killer in quiets]
+        for killer in killers:
+            yield killer
+        history = self.history
+        scored = [(history.get((gs.piece_on(code & 63), code >> 6 & 63), 0), code)
+                  for code in quiets if code not in killers]
+        scored.sort(reverse=True)
+        for _, code in scored:
+            yield code
+
+    def _record_cutoff(self, gs, move, depth, ply):
+        killers = self.killers[ply]
+        if move != killers[0]:
+            killers[1] = killers[0]
+            killers[0] = move
+        history_key = (gs.piece_on(move & 63), move >> 6 & 63)
+        self.history[history_key] = self.history.get(history_key, 0) + depth * depth
+
+    def _principal_variation(self, gs, depth):
+        # Follow the best moves stored in the transposition table
+        pv = []
+        seen = set()
+        for _ in range(depth):
+            entry = self.tt.probe(gs.zobrist_key)
+            if entry is None or gs.zobrist_key in seen or entry[4] not in gs.get_valid_move_codes():
+                break
+            seen.add(gs.zobrist_key)
+            move = gs.move_from_code(entry[4])
+            pv.append(move)
+            gs.make_move(move)
+        for _ in pv:
+            gs.undo_move()
+        return pv
+
+
+def find_best_move(gs, depth=None, movetime=None, nodes=None):
+    """
+    Convenience wrapper: searches the position with a fresh Searcher.
+    """
+    return Searcher().search(gs, depth=depth, movetime=movetime, nodes=nodes)
@@ -0,0 +1,215 @@
+"""
+Headless self-play.
+
+Plays batches of games between pluggable move choosers on a process pool, without pygame, and
+streams every game to a PGN or JSONL file as soon as it finishes. Prints games per second,
+the average game length and the result distribution at the end.
+
+    python selfplay.py --games 1000 --out games.pgn
+    python selfplay.py --games 200 --white search --depth 2 --out games.jsonl --workers 8
+"""
+import argparse
+import collections
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import chess_engine
+import pgn
+
+
+class RandomChooser:
+    """
+    Plays a uniformly random legal move.
+    """
+    def __init__(self, seed, options):
+        self.random = random.Random(seed)
+
+    def choose(self, gs, moves):
+        return self.random.choice(moves)
+
+
+class SearchChooser:
+    """
+    Plays the search engine's best move within the depth/movetime/nodes limits in options.
+    """
+    def __init__(self, seed, options):
+        import search
+        self.searcher = search.Searcher()
+        self.limits = {name: options.get(name) for name in ("depth", "movetime", "nodes")}
+        if not any(self.limits.values()):
+            self.limits["depth"] = 2
+
+    def choose(self, gs, moves):
+        return self.searcher.search(gs, **self.limits).best_move.code
+
+
+# Move choosers by name. A chooser is built once per game from (seed, options) and asked for a
+# move with choose(gs, move_codes), which returns one of the codes
+CHOOSERS = {
+    "random": RandomChooser,
+    "search": SearchChooser,
+}
+
+
+def insufficient_material(gs):
+    """
+    True when neither side can possibly mate: bare kings, or a single knight or bishop left.
+    """
+    minors = 0
+    for row in gs.board:
+        for piece in row:
+            if piece[1] in 'PRQ':
+                return False
+            if piece[1] in 'NB':
+                minors += 1
+    return minors <= 1
+
+
+def play_game(index, white, black, seed, options, max_plies, fen=None, san=True):
+    """
+    Plays one game in a worker process and returns it as a dict ready for JSON.
+    """
+    gs = chess_engine.GameState.from_fen(fen) if fen else chess_engine.GameState()
+    choosers = {True: CHOOSERS[white](seed * 2, options), False: CHOOSERS[black](seed * 2 + 1, options)}
+    start = time.perf_counter()
+    moves, sans = [], []
+    while True:
+        codes = gs.get_valid_move_codes()
+        if gs.checkmate:
+            result, termination = ("0-1" if gs.white_to_move else "1-0"), "checkmate"
+            break
+        if gs.stalemate:
+            result, termination = "1/2-1/2", "stalemate"
+            break
+        if gs.draw:
+            result, termination = "1/2-1/2", "threefold repetition" if gs.is_threefold_repetition() else "fifty-move rule"
+            break
+        if insufficient_material(gs):
+            result, termination = "1/2-1/2", "insufficient material"
+            break
+        if len(moves) >= max_plies:
+            result, termination = "*", "ply limit"
+            break
+        move = gs.move_from_code(choosers[gs.white_to_move].choose(gs, codes))
+        if san:
+            sans.append(pgn.move_to_san(gs, move))
+        moves.append(move.get_chess_notation())
+        gs.make_move(move)
+    return {
+        "index": index,
+        "white": white,
+        "black": black,
+        "seed": seed,
+        "fen": fen,
+        "start_ply": gs.start_ply,
+        "result": result,
+        "termination": termination,
+        "plies": len(moves),
+        "moves": moves,
+        "san": sans if san else None,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def format_pgn(game):
+    headers = {
+        "Event": "Self-play",
+        "Site": "?",
+        "Date": time.strftime("%Y.%m.%d"),
+        "Round": str(game["index"] + 1),
+        "White": game["white"],
+        "Black": game["black"],
+        "Result": game["result"],
+    }
+    if game["fen"]:
+        headers["SetUp"] = "1"
+        headers["FEN"] = game["fen"]
+    headers["Termination"] = game["termination"]
+    headers["PlyCount"] = str(game["plies"])
+    return pgn.format_game(headers, game["san"], game["result"], game["start_ply"])
+
+
+def run(games, white="random", black="random", workers=None, seed=0, options=None, max_plies=400,
+        fen=None, out=None, output_format="pgn"):
+    """
+    Plays `games` games across a process pool, writing each one to `out` (a file object or None)
+    as it finishes, and returns summary statistics.
+    """
+    options = options or {}
+    workers = workers or os.cpu_count() or 1
+    results = collections.Counter()
+    terminations = collections.Counter()
+    total_plies = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Keep a few games queued per worker rather than submitting everything up front, so
+        # memory stays flat for large batches
+        next_index = 0
+        pending = set()
+        while next_index < games or pending:
+            while next_index < games and len(pending) < workers * 4:
+                pending.add(executor.submit(play_game, next_index, white, black, seed + next_index, options,
+                                            max_plies, fen, output_format == "pgn"))
+                next_index += 1
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                game = future.result()
+                results[game["result"]] += 1
+                terminations[game["termination"]] += 1
+                total_plies += game["plies"]
+                if out is not None:
+                    out.write(format_pgn(game) if output_format == "pgn" else json.dumps(game) + "\n")
+                    out.flush()
+    seconds = time.perf_counter() - start
+    return {
+        "games": games,
+        "seconds": round(seconds, 3),
+        "games_per_second": round(games / seconds, 2) if seconds > 0 else 0,
+        "average_plies": round(total_plies / games, 1) if games else 0,
+        "results": dict(results),
+        "terminations": dict(terminations),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play games between move choosers without the GUI.")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--white", choices=sorted(CHOOSERS), default="random")
+    parser.add_argument("--black", choices=sorted(CHOOSERS), default="random")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--depth", type=int, default=None, help="search chooser depth")
+    parser.add_argument("--movetime", type=float, default=None, help="search chooser seconds per move")
+    parser.add_argument("--nodes", type=int, default=None, help="search chooser nodes per move")
+    parser.add_argument("--max-plies", type=int, default=400, help="unfinished games are scored '*'")
+    parser.add_argument("--fen", help="starting position (default: the standard one)")
+    parser.add_argument("--out", metavar="PATH", help="write games to PATH (.pgn or .jsonl)")
+    parser.add_argument("--format", choices=("pgn", "jsonl"), default=None,
+                        help="output format (default: from the --out extension)")
+    args = parser.parse_args(argv)
+
+    output_format = args.format or ("jsonl" if args.out and args.out.endswith((".jsonl", ".json")) else "pgn")
+    options = {"depth": args.depth, "movetime": args.movetime, "nodes": args.nodes}
+    out = open(args.out, "w") if args.out else None
+    try:
+        stats = run(args.games, args.white, args.black, args.workers, args.seed, options, args.max_plies,
+                    args.fen, out, output_format)
+    finally:
+        if out is not None:
+            out.close()
+    print(f"games {stats['games']}  {stats['seconds']:.2f}s  {stats['games_per_second']} games/s  "
+          f"average plies {stats['average_plies']}")
+    for result in pgn.RESULTS:
+        if result in stats["results"]:
+            print(f"  {result:<8} {stats['results'][result]}")
+    for termination, count in sorted(stats["terminations"].items(), key=lambda item: -item[1]):
+        print(f"  {termination}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Rules engine checks for both backends: perft node counts, FEN round trips, and make/undo
+restoring everything a move changes.
+
+    python -m pytest -q
+"""
+import pytest
+
+import chess_engine
+import perft
+
+BACKENDS = ("list", "bitboard")
+PERFT_DEPTH = 3
+FENS = [fen for _, fen, _ in perft.SUITE] + [
+    "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1",
+    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+    "4k3/8/8/8/8/8/8/4K2R w K - 37 80",
+]
+
+
+def _state(gs):
+    # Everything make_move changes and undo_move must put back
+    return (gs.to_fen(), gs.zobrist_key, gs.current_castling_rights.index(), gs.en_passant_possible,
+            gs.halfmove_clock, gs.evaluate(), len(gs.move_log))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("name, fen, expected", perft.SUITE, ids=[name for name, _, _ in perft.SUITE])
+def test_perft(backend, name, fen, expected):
+    gs = perft.make_game_state(backend).load_fen(fen)
+    assert perft.perft(gs, PERFT_DEPTH) == expected[PERFT_DEPTH]
+    assert gs.to_fen() == fen
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("fen", FENS)
+def test_fen_round_trip(backend, fen):
+    gs = perft.make_game_state(backend).load_fen(fen)
+    assert gs.to_fen() == fen
+    assert gs.zobrist_key == gs.compute_zobrist_key()
+    assert type(gs).from_fen(gs.to_fen()).to_fen() == fen
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("fen", ["rnbqkbnr/pppppppp/8/8 w - - 0 1", "8/8/8/8/8/8/8/8 w - - 0 1",
+                                 "4k3/8/8/8/8/8/8/4K3 x - - 0 1", "4k3/8/8/8/8/8/8/4K3 w - e 0 1",
+                                 "P3k3/8/8/8/8/8/8/4K3 w - - 0 1", "4k3/8/8/8/8/8/8/4K2p b - - 0 1",
+                                 "8/8/8/8/8/2k5/8/K1Q5 w - - 0 1", "8/8/8/8/8/8/8/kK6 b - - 0 1"])
+def test_bad_fen(backend, fen):
+    gs = perft.make_game_state(backend)
+    with pytest.raises(ValueError):
+        gs.load_fen(fen)
+    assert gs.to_fen() == chess_engine.START_FEN # Left as it was
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("fen, rights, castles", [("4k3/8/8/8/8/8/8/R3K3 w KQ - 0 1", "Q", {"e1c1"}),
+                                                  ("4k3/8/8/8/8/8/8/7K w K - 0 1", "-", set()),
+                                                  ("r3k3/8/8/8/8/8/8/4K2R w KQkq - 0 1", "Kq", {"e1g1"}),
+                                                  ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "KQkq", {"e1g1", "e1c1"})])
+def test_castling_rights_need_king_and_rook_at_home(backend, fen, rights, castles):
+    gs = perft.make_game_state(backend).load_fen(fen)
+    assert gs.to_fen().split()[2] == rights
+    assert {gs.move_from_code(code).get_chess_notation() for code in gs.get_valid_move_codes()
+            if code & chess_engine.CASTLE_FLAG} == castles
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("fen", FENS)
+def test_make_undo_restores_state(backend, fen):
+    gs = perft.make_game_state(backend).load_fen(fen)
+    before = _state(gs)
+    for code in gs.get_valid_move_codes():
+        gs.make_move(code)
+        assert gs.zobrist_key == gs.compute_zobrist_key()
+        after = _state(gs)
+        for reply in gs.get_valid_move_codes(): # Two plies deep, so castling rights lost to captures are covered
+            gs.make_move(reply)
+            assert gs.zobrist_key == gs.compute_zobrist_key()
+            gs.undo_move()
+            assert _state(gs) == after
+        gs.undo_move()
+        assert _state(gs) == before
@@ -0,0 +1,35 @@
+"""
+ParallelSearcher checks: the workers' answers must be compared at the depth the search was
+asked for, however the root moves are dealt out.
+
+    python -m pytest -q
+"""
+import pytest
+
+import chess_engine
+from parallel_search import ParallelSearcher
+
+# White's king has three moves, so with three or more workers each one gets a single move
+FEW_MOVES_FEN = "4k3/pppp4/8/8/8/8/8/K7 w - - 0 1"
+
+
+@pytest.fixture(scope="module")
+def searcher():
+    with ParallelSearcher(workers=4) as searcher:
+        yield searcher
+
+
+def test_one_root_move_per_worker_reaches_full_depth(searcher):
+    gs = chess_engine.GameState.from_fen(FEW_MOVES_FEN)
+    assert len(gs.get_valid_move_codes()) < searcher.workers
+    result = searcher.search(gs, depth=4)
+    assert result.depth == 4
+    assert result.best_move.get_chess_notation() in ("a1a2", "a1b1", "a1b2")
+
+
+def test_share_with_a_mate_reaches_full_depth(searcher):
+    # Re8 mates at once; the worker holding it must not stop early and drag the others down
+    gs = chess_engine.GameState.from_fen("6k1/5ppp/8/8/8/8/5PPP/4R1K1 w - - 0 1")
+    result = searcher.search(gs, depth=3)
+    assert result.depth == 3
+    assert result.best_move.get_chess_notation() == "e1e8"
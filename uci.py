@@ -0,0 +1,259 @@
+"""
+UCI (Universal Chess Interface) front end.
+
+Runs the search behind the standard UCI text protocol on stdin/stdout, so tournament managers
+and match scripts can play it against other engines. It only needs the rules engine and the
+search, never pygame or the piece images, and starts in well under a tenth of a second.
+
+The main thread reads commands while "go" searches on a background thread, so "stop" and
+"quit" interrupt a running search. Supported: uci, isready, ucinewgame, setoption (BookFile,
+OwnBook, Hash), position, go (depth, movetime, nodes, wtime/btime/winc/binc/movestogo,
+infinite, perft), stop, quit, plus perft <depth> and d (print the position's FEN).
+
+    python uci.py
+"""
+import sys
+import threading
+import time
+
+import chess_engine
+import search
+
+ENGINE_NAME = "Mini-game"
+DEFAULT_HASH_MB = 32
+# Rough size of one transposition table entry once the table fills up
+HASH_ENTRY_BYTES = 100
+# Share of the remaining clock spent on one move when the GUI sends no movestogo
+DEFAULT_MOVES_TO_GO = 30
+GO_PARAMETERS = ("depth", "nodes", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "perft")
+
+
+class UciEngine:
+    def __init__(self, output=None):
+        self.output = output or self._print
+        self._output_lock = threading.Lock()
+        self.gs = chess_engine.GameState()
+        self._spare_gs = chess_engine.GameState() # "position" is set up here, then swapped in
+        self.searcher = search.Searcher(hash_bits(DEFAULT_HASH_MB))
+        self.book_path = None
+        self.own_book = True
+        self._book = None
+        self._search_thread = None
+        self._stop_requested = threading.Event()
+
+    @staticmethod
+    def _print(line):
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+    def send(self, line):
+        with self._output_lock: # The search thread reports while the main thread answers commands
+            self.output(line)
+
+    def handle(self, line):
+        """
+        Handles one command line. Returns False once the engine should exit.
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        try:
+            return self._dispatch(command, args)
+        except ValueError as e: # A malformed command leaves the engine as it was
+            self.send(f"info string {command}: {e}")
+            return True
+
+    def _dispatch(self, command, args):
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send("id author the Mini-game authors")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max 1024")
+            self.send("option name OwnBook type check default true")
+            self.send("option name BookFile type string default <empty>")
+            self.send("uciok")
+        elif command == "isready": # Answered at once, even while searching
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.wait()
+            self.searcher.tt.clear()
+        elif command == "setoption":
+            self.wait()
+            self._set_option(args)
+        elif command == "position":
+            self.wait()
+            self._set_position(args)
+        elif command == "go":
+            self.wait()
+            self._go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "perft":
+            self.wait()
+            self._perft(int(args[0]) if args else 1)
+        elif command == "d":
+            self.wait()
+            self.send(self.gs.to_fen())
+        elif command == "quit":
+            self.stop()
+            self.close()
+            return False
+        return True # Unknown commands are ignored, as the protocol asks
+
+    def stop(self):
+        if self._search_thread is not None:
+            self._stop_requested.set()
+            self.searcher.stop()
+            self.wait()
+
+    def wait(self):
+        # Lets a running search finish (it has been told to stop, or has limits of its own)
+        if self._search_thread is not None:
+            self._search_thread.join()
+            self._search_thread = None
+
+    def close(self):
+        if self._book is not None:
+            self._book.close()
+            self._book = None
+
+    def _set_option(self, args):
+        # setoption name <name with spaces> [value <value with spaces>]
+        if "name" not in args:
+            return
+        value_at = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:value_at]).lower()
+        value = " ".join(args[value_at + 1:])
+        if name == "hash":
+            self.searcher = search.Searcher(hash_bits(int(value)))
+        elif name == "ownbook":
+            self.own_book = value.lower() == "true"
+        elif name == "bookfile":
+            self.close()
+            self.book_path = value if value and value != "<empty>" else None
+
+    def _set_position(self, args):
+        # position (startpos | fen <fen>) [moves <move> ...]. Set up on the spare GameState,
+        # so a bad FEN or an illegal move keeps the previous position
+        moves_at = args.index("moves") if "moves" in args else len(args)
+        gs = self._spare_gs
+        gs.load_fen(" ".join(args[1:moves_at]) if args and args[0] == "fen" else chess_engine.START_FEN)
+        for notation in args[moves_at + 1:]:
+            for code in gs.get_valid_move_codes():
+                move = gs.move_from_code(code)
+                if move.get_chess_notation() == notation:
+                    gs.make_move(move)
+                    break
+            else:
+                raise ValueError(f"illegal move {notation}")
+        self.gs, self._spare_gs = gs, self.gs
+
+    def _go(self, args):
+        # Numeric parameters come as name/value pairs; infinite and ponder stand alone
+        flags = {arg for arg in args if arg in ("infinite", "ponder")}
+        values = {}
+        pairs = [arg for arg in args if arg not in flags]
+        for name, value in zip(pairs[::2], pairs[1::2]):
+            if name in GO_PARAMETERS: # Bad numbers are reported before anything starts
+                values[name] = int(value)
+        if "perft" in values:
+            self._perft(values["perft"])
+            return
+        limits = {}
+        if "depth" in values:
+            limits["depth"] = values["depth"]
+        if "nodes" in values:
+            limits["nodes"] = values["nodes"]
+        if "movetime" in values:
+            limits["movetime"] = values["movetime"] / 1000
+        clock = values.get("wtime" if self.gs.white_to_move else "btime")
+        if clock is not None and "movetime" not in limits and not flags:
+            # Spread the clock over the moves left, keeping a margin for move overhead
+            clock = clock / 1000
+            increment = values.get("winc" if self.gs.white_to_move else "binc", 0) / 1000
+            budget = clock / max(1, values.get("movestogo", DEFAULT_MOVES_TO_GO)) + increment / 2
+            limits["movetime"] = max(0.01, min(budget, clock - 0.05))
+        self._stop_requested.clear()
+        self.searcher.stopped = False
+        self._search_thread = threading.Thread(target=self._search, args=(limits, bool(flags)), daemon=True)
+        self._search_thread.start()
+
+    def _search(self, limits, until_stopped):
+        completed = [] # The last finished iteration, in case the search fails part way
+        root_length = len(self.gs.move_log)
+        try:
+            move = self._book_move()
+            if move is None:
+                start = time.perf_counter()
+
+                def report(result):
+                    completed[:] = [result.best_move]
+                    self._report(result, start)
+                move = self.searcher.search(self.gs, on_iteration=report, **limits).best_move
+        except Exception as e: # The GUI waits for a bestmove however the search ends
+            self.send(f"info string search failed: {type(e).__name__}: {e}")
+            move = completed[0] if completed else None
+            while len(self.gs.move_log) > root_length: # Unwind the moves made below the root
+                self.gs.undo_move()
+        if until_stopped: # "go infinite" only answers once the GUI says stop
+            self._stop_requested.wait()
+        self.send(f"bestmove {move.get_chess_notation() if move is not None else '0000'}")
+
+    def _book_move(self):
+        if not self.own_book or self.book_path is None:
+            return None
+        if self._book is None:
+            import polyglot
+            try:
+                self._book = polyglot.PolyglotBook(self.book_path)
+            except (OSError, ValueError) as e:
+                self.send(f"info string cannot open book {self.book_path}: {e}")
+                self.book_path = None
+                return None
+        return self._book.choose_move(self.gs)
+
+    def _report(self, result, start):
+        elapsed = time.perf_counter() - start
+        if abs(result.score) >= search.MATE_SCORE - search.MAX_PLY:
+            plies = search.MATE_SCORE - abs(result.score)
+            score = f"mate {(plies + 1) // 2 if result.score > 0 else -((plies + 1) // 2)}"
+        else:
+            score = f"cp {result.score}"
+        self.send(f"info depth {result.depth} score {score} nodes {result.nodes} "
+                  f"nps {int(result.nodes / elapsed) if elapsed > 0 else 0} time {int(elapsed * 1000)} "
+                  f"pv {' '.join(move.get_chess_notation() for move in result.pv)}")
+
+    def _perft(self, depth):
+        import perft
+        start = time.perf_counter()
+        counts = perft.divide(self.gs, depth)
+        for notation, nodes in counts.items():
+            self.send(f"{notation}: {nodes}")
+        seconds = time.perf_counter() - start
+        total = sum(counts.values())
+        self.send("")
+        self.send(f"Nodes searched: {total}")
+        self.send(f"info string perft {depth} in {seconds:.3f}s ({total / seconds if seconds > 0 else 0:.0f} nps)")
+
+
+def hash_bits(megabytes):
+    """
+    Transposition table size (as a power of two) that fits in the given number of megabytes.
+    """
+    return max(10, (max(1, megabytes) * 2 ** 20 // HASH_ENTRY_BYTES).bit_length() - 1)
+
+
+def main():
+    engine = UciEngine()
+    try:
+        for line in sys.stdin:
+            if not engine.handle(line):
+                break
+    finally:
+        engine.stop()
+        engine.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())